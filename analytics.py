@@ -0,0 +1,152 @@
+"""
+Reset counters and reset statistics backed by ``amat_analytics.EmployeeResetCount``.
+"""
+import logging
+
+from amat_analytics.models import EmployeeResetCount
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+log = logging.getLogger(__name__)
+
+DATE_BUCKETS = {
+    "day": TruncDay,
+    "week": TruncWeek,
+    "month": TruncMonth,
+}
+GROUP_BY_FIELDS = {
+    "course": "course_enrollment__course_id",
+    "org": "course_enrollment__course__org",
+}
+
+
+def _supports_upsert(using):
+    field = EmployeeResetCount._meta.get_field("course_enrollment")
+    return connections[using].vendor == "mysql" and field.unique
+
+
+def _upsert_reset_count(using, enrollment_id, now):
+    meta = EmployeeResetCount._meta
+    table = meta.db_table
+    enrollment = meta.get_field("course_enrollment").column
+    count = meta.get_field("reset_count").column
+    first = meta.get_field("first_reset_date").column
+    last = meta.get_field("last_reset_date").column
+    sql = (
+        f"INSERT INTO {table} ({enrollment}, {count}, {first}, {last}) VALUES (%s, 1, %s, %s) "
+        f"ON DUPLICATE KEY UPDATE {count} = {count} + 1, {last} = VALUES({last})"
+    )
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, [enrollment_id, now, now])
+
+
+def increment_reset_count(enrollment_id):
+    """
+    Count one reset for an enrollment.
+
+    On MySQL, with a unique ``course_enrollment`` column, this is a single
+    ``INSERT ... ON DUPLICATE KEY UPDATE``. Otherwise it is an ``UPDATE``
+    with an ``F()`` increment, followed by an ``INSERT`` only for the first
+    reset of the enrollment.
+    """
+    now = timezone.now()
+    using = router.db_for_write(EmployeeResetCount)
+    if _supports_upsert(using):
+        _upsert_reset_count(using, enrollment_id, now)
+        return
+    counted = EmployeeResetCount.objects.filter(course_enrollment_id=enrollment_id)
+    if counted.update(reset_count=F("reset_count") + 1, last_reset_date=now):
+        return
+    try:
+        with transaction.atomic():
+            EmployeeResetCount.objects.create(
+                course_enrollment_id=enrollment_id,
+                reset_count=1,
+                first_reset_date=now,
+                last_reset_date=now,
+            )
+    except IntegrityError:
+        counted.update(reset_count=F("reset_count") + 1, last_reset_date=now)
+
+
+def bulk_increment_reset_counts(enrollment_ids):
+    """
+    Count one reset for each of many enrollments with one ``F()`` update and
+    one bulk insert for the enrollments never reset before.
+    """
+    if not enrollment_ids:
+        return
+    now = timezone.now()
+    counted = EmployeeResetCount.objects.filter(course_enrollment_id__in=enrollment_ids)
+    existing = set(counted.values_list("course_enrollment_id", flat=True))
+    counted.update(reset_count=F("reset_count") + 1, last_reset_date=now)
+    new_ids = [enrollment_id for enrollment_id in enrollment_ids if enrollment_id not in existing]
+    try:
+        with transaction.atomic():
+            EmployeeResetCount.objects.bulk_create(
+                [
+                    EmployeeResetCount(
+                        course_enrollment_id=enrollment_id,
+                        reset_count=1,
+                        first_reset_date=now,
+                        last_reset_date=now,
+                    )
+                    for enrollment_id in new_ids
+                ]
+            )
+    except IntegrityError:
+        # Some were created concurrently; count those one at a time.
+        for enrollment_id in new_ids:
+            increment_reset_count(enrollment_id)
+
+
+def reset_statistics(group_by=None, bucket=None, course_key=None, org=None, start=None, end=None):
+    """
+    Aggregate reset counters per course, per org and/or per date bucket of
+    the last reset. Filters on course and org go through the indexed
+    CourseEnrollment/CourseOverview columns.
+
+    Only each enrollment's lifetime count and last reset date are stored, not
+    individual resets. So a date bucket (and the ``start``/``end`` filters)
+    selects the enrollments last reset in it, and their lifetime resets, some
+    of which happened earlier. Bucketed rows are labelled accordingly.
+    """
+    rows = EmployeeResetCount.objects.all()
+    if course_key is not None:
+        rows = rows.filter(course_enrollment__course_id=course_key)
+    if org:
+        rows = rows.filter(course_enrollment__course__org=org)
+    if start:
+        rows = rows.filter(last_reset_date__gte=start)
+    if end:
+        rows = rows.filter(last_reset_date__lt=end)
+
+    group_fields = []
+    if group_by:
+        rows = rows.annotate(group=F(GROUP_BY_FIELDS[group_by]))
+        group_fields.append("group")
+    if bucket:
+        rows = rows.annotate(bucket=DATE_BUCKETS[bucket]("last_reset_date"))
+        group_fields.append("bucket")
+    if group_fields:
+        rows = rows.values(*group_fields).order_by(*group_fields)
+        results = rows.annotate(learners=Count("id"), resets=Sum("reset_count"))
+        return [
+            {
+                **({group_by: str(row["group"])} if group_by else {}),
+                **(
+                    {
+                        "bucket": row["bucket"].isoformat(),
+                        "enrollments_last_reset_in_bucket": row["learners"],
+                        "lifetime_resets": row["resets"] or 0,
+                    }
+                    if bucket
+                    else {"learners": row["learners"], "resets": row["resets"] or 0}
+                ),
+            }
+            for row in results
+        ]
+    totals = rows.aggregate(learners=Count("id"), resets=Sum("reset_count"))
+    return [{"learners": totals["learners"], "resets": totals["resets"] or 0}]
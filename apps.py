@@ -7,6 +7,7 @@ from __future__ import unicode_literals
 from django.apps import AppConfig
 from openedx.core.djangoapps.plugins.constants import (
     PluginSettings,
+    PluginSignals,
     PluginURLs,
     ProjectType,
     SettingsType,
@@ -24,6 +25,8 @@ class AMATCustomViewsConfig(AppConfig):
     verbose_name = "AMAT Custom Views"
 
     # Class attribute that configures and enables this app as a Plugin App.
+    # The views and the progress receivers are LMS-only; Studio only needs
+    # the settings and the course publish receivers connected in ``ready``.
     plugin_app = {
         PluginURLs.CONFIG: {
             ProjectType.LMS: {
@@ -32,12 +35,6 @@ class AMATCustomViewsConfig(AppConfig):
                 PluginURLs.REGEX: r"^",
                 PluginURLs.RELATIVE_PATH: "urls",
             },
-            ProjectType.CMS: {
-                PluginURLs.NAMESPACE: EXTENSIONS_APP_NAME,
-                PluginURLs.APP_NAME: EXTENSIONS_APP_NAME,
-                PluginURLs.REGEX: r"^",
-                PluginURLs.RELATIVE_PATH: "urls",
-            },
         },
         PluginSettings.CONFIG: {
             ProjectType.LMS: {
@@ -69,4 +66,26 @@ class AMATCustomViewsConfig(AppConfig):
                 },
             },
         },
+        PluginSignals.CONFIG: {
+            ProjectType.LMS: {
+                PluginSignals.RELATIVE_PATH: "signals",
+                PluginSignals.RECEIVERS: [
+                    {
+                        PluginSignals.RECEIVER_FUNC_NAME: "invalidate_progress_on_score_change",
+                        PluginSignals.SIGNAL_PATH: (
+                            "lms.djangoapps.grades.signals.signals.PROBLEM_WEIGHTED_SCORE_CHANGED"
+                        ),
+                        PluginSignals.DISPATCH_UID: "custom_views.invalidate_progress_on_score_change",
+                    },
+                    {
+                        PluginSignals.RECEIVER_FUNC_NAME: "invalidate_progress_on_grade_change",
+                        PluginSignals.SIGNAL_PATH: "openedx.core.djangoapps.signals.signals.COURSE_GRADE_CHANGED",
+                        PluginSignals.DISPATCH_UID: "custom_views.invalidate_progress_on_grade_change",
+                    },
+                ],
+            },
+        },
     }
+
+    def ready(self):
+        from custom_views import signals  # pylint: disable=unused-import
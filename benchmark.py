@@ -0,0 +1,400 @@
+"""
+Benchmarks for the reset, progress and grades paths.
+
+A synthetic course and its learners are created inside a transaction that is
+rolled back at the end, so nothing is left in the database. The modulestore,
+submissions API, tracker and grade computation are replaced by in-memory
+stand-ins: the numbers measure this plugin's own work and queries, not the
+platform's.
+
+The benchmark still writes up to millions of rows and holds their locks while
+it runs, so it refuses to run against a database that is not a test database
+unless explicitly allowed.
+
+Run through the ``benchmark_custom_views`` management command.
+"""
+import json
+import math
+import statistics
+import uuid
+from collections import OrderedDict, namedtuple
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import RequestFactory
+from opaque_keys.edx.keys import CourseKey
+
+from custom_views.instrumentation import measure
+
+SCENARIOS = (
+    "answered_count",
+    "calculate_grade_stats",
+    "get_grades",
+    "service_reset_course",
+    "change_enrollment_reset",
+)
+# Scenarios that consume one learner per iteration.
+RESET_SCENARIOS = ("service_reset_course", "change_enrollment_reset")
+DEFAULT_TOLERANCE = 0.25
+
+
+class UnsafeDatabaseError(Exception):
+    """
+    The benchmark would write to a database that is not a test database.
+    """
+
+
+def is_test_database(using=DEFAULT_DB_ALIAS):
+    """
+    True when ``using`` is a database created by Django's test runner.
+    """
+    settings_dict = connections[using].settings_dict
+    name = str(settings_dict.get("NAME") or "")
+    test_name = (settings_dict.get("TEST") or {}).get("NAME")
+    return (
+        name.startswith("test_")
+        or (test_name is not None and name == test_name)
+        or name == ":memory:"
+        or "mode=memory" in name
+    )
+
+
+Score = namedtuple("Score", ["earned", "possible", "graded"])
+Total = namedtuple("Total", ["earned", "possible"])
+
+
+class FakeBlock:
+    """
+    Just enough of an XBlock for the block index and the reset engine.
+    """
+
+    def __init__(self, location, children=(), has_score=False):
+        self.location = location
+        self._children = list(children)
+        self.children = [child.location for child in self._children]
+        self.has_children = bool(self._children)
+        self.has_score = has_score
+        self.weight = 1.0 if has_score else None
+        self.display_name = location.block_id
+
+    def get_children(self):
+        return self._children
+
+    def max_score(self):
+        return 1.0
+
+
+class FakeModuleStore:
+    """
+    In-memory modulestore holding the synthetic course tree.
+    """
+
+    def __init__(self, course):
+        self.course = course
+        self.items = {}
+        stack = [course]
+        while stack:
+            block = stack.pop()
+            self.items[block.location] = block
+            stack.extend(block.get_children())
+
+    def get_course(self, course_key, depth=0):  # pylint: disable=unused-argument
+        return self.course
+
+    def get_item(self, usage_key):
+        from xmodule.modulestore.exceptions import ItemNotFoundError
+
+        try:
+            return self.items[usage_key]
+        except KeyError:
+            raise ItemNotFoundError(usage_key)  # lint-amnesty, pylint: disable=raise-missing-from
+
+    def make_course_usage_key(self, course_key):  # pylint: disable=unused-argument
+        return self.course.location
+
+    @contextmanager
+    def branch_setting(self, branch, course_key=None):  # pylint: disable=unused-argument
+        yield
+
+    @contextmanager
+    def bulk_operations(self, course_key):  # pylint: disable=unused-argument
+        yield
+
+
+class FakeSubmissionsApi:
+    def __init__(self):
+        self.resets = 0
+
+    def reset_score(self, *args, **kwargs):  # pylint: disable=unused-argument
+        self.resets += 1
+
+
+class FakeTracker:
+    def __init__(self):
+        self.events = 0
+
+    def emit(self, *args, **kwargs):  # pylint: disable=unused-argument
+        self.events += 1
+
+
+class FakeSubsectionGrade:
+    def __init__(self, block):
+        self.location = block.location
+        self.display_name = block.display_name
+        self.format = "Homework"
+        self.graded = True
+        self.due = None
+        self.problem_scores = OrderedDict()
+        for vertical in block.get_children():
+            for problem in vertical.get_children():
+                self.problem_scores[problem.location] = Score(1.0, 1.0, True)
+        possible = float(len(self.problem_scores))
+        self.all_total = Total(possible, possible)
+        self.graded_total = Total(possible, possible)
+
+
+class FakeCourseGrade:
+    """
+    A course grade with the shape ``get_grades`` serializes.
+    """
+
+    passed = True
+    percent = 1.0
+    letter_grade = "Pass"
+
+    def __init__(self, course):
+        self.chapter_grades = OrderedDict(
+            (
+                chapter.location,
+                {
+                    "display_name": chapter.display_name,
+                    "url_name": chapter.location.block_id,
+                    "sections": [FakeSubsectionGrade(sequential) for sequential in chapter.get_children()],
+                },
+            )
+            for chapter in course.get_children()
+        )
+
+
+def build_course(course_key, problems, problems_per_subsection=10, subsections_per_chapter=5):
+    """
+    Return the root FakeBlock of a course with ``problems`` problems.
+    """
+    chapters, sequentials = [], []
+    problem_blocks = [
+        FakeBlock(course_key.make_usage_key("problem", f"problem_{index}"), has_score=True)
+        for index in range(problems)
+    ]
+    for start in range(0, problems, problems_per_subsection):
+        index = len(sequentials)
+        vertical = FakeBlock(
+            course_key.make_usage_key("vertical", f"vertical_{index}"),
+            problem_blocks[start:start + problems_per_subsection],
+        )
+        sequentials.append(FakeBlock(course_key.make_usage_key("sequential", f"sequential_{index}"), [vertical]))
+    for start in range(0, len(sequentials), subsections_per_chapter):
+        chapters.append(
+            FakeBlock(
+                course_key.make_usage_key("chapter", f"chapter_{len(chapters)}"),
+                sequentials[start:start + subsections_per_chapter],
+            )
+        )
+    course = FakeBlock(course_key.make_usage_key("course", "course"), chapters)
+    course.course_version = f"bench-{problems}"
+    return course
+
+
+def create_learners(course_key, course, learners, answered_ratio=0.5, batch_size=1000):
+    """
+    Create ``learners`` enrolled users with StudentModule rows for every
+    problem of ``course``, ``answered_ratio`` of them answered.
+    """
+    from common.djangoapps.student.models import CourseEnrollment
+    from lms.djangoapps.courseware.models import StudentModule
+
+    prefix = uuid.uuid4().hex[:8]
+    user_model = get_user_model()
+    user_model.objects.bulk_create(
+        [
+            user_model(username=f"bench_{prefix}_{index}", email=f"bench_{prefix}_{index}@example.com")
+            for index in range(learners)
+        ],
+        batch_size=batch_size,
+    )
+    users = list(user_model.objects.filter(username__startswith=f"bench_{prefix}_").order_by("id"))
+    CourseEnrollment.objects.bulk_create(
+        [CourseEnrollment(user=user, course_id=course_key, is_active=True, mode="audit") for user in users],
+        batch_size=batch_size,
+    )
+    problems = [
+        block.location
+        for block in FakeModuleStore(course).items.values()
+        if block.location.block_type == "problem"
+    ]
+    answered = int(len(problems) * answered_ratio)
+    answered_state = json.dumps({"attempts": 1, "correct_map": {"1": {"correctness": "correct"}}})
+    rows = []
+    for user in users:
+        for index, usage_key in enumerate(problems):
+            rows.append(
+                StudentModule(
+                    student=user,
+                    course_id=course_key,
+                    module_state_key=usage_key,
+                    module_type="problem",
+                    state=answered_state if index < answered else "{}",
+                )
+            )
+            if len(rows) >= batch_size:
+                StudentModule.objects.bulk_create(rows)
+                rows = []
+    StudentModule.objects.bulk_create(rows)
+    return users
+
+
+@contextmanager
+def stand_ins(course):
+    """
+    Replace the modulestore, submissions API, tracker and grade computation
+    with in-memory versions for the duration of the block.
+    """
+    store = FakeModuleStore(course)
+    submissions = FakeSubmissionsApi()
+    tracker = FakeTracker()
+    with ExitStack() as stack:
+        for target in (
+            "custom_views.block_index.modulestore",
+            # reset and utils import these at call time.
+            "xmodule.modulestore.django.modulestore",
+        ):
+            stack.enter_context(mock.patch(target, return_value=store))
+        stack.enter_context(mock.patch("submissions.api.reset_score", submissions.reset_score))
+        stack.enter_context(mock.patch("custom_views.events.tracker", tracker))
+        stack.enter_context(mock.patch("eventtracking.tracker.emit", tracker.emit))
+        stack.enter_context(mock.patch("custom_views.reset.update_grades_after_reset"))
+        stack.enter_context(mock.patch("custom_views.utils.get_course_by_id", return_value=course))
+        stack.enter_context(
+            mock.patch("custom_views.utils.read_course_grade", return_value=FakeCourseGrade(course))
+        )
+        yield
+
+
+def percentile(durations, fraction):
+    ordered = sorted(durations)
+    return ordered[min(len(ordered) - 1, int(math.ceil(fraction * len(ordered))) - 1)]
+
+
+def summarize(durations, queries):
+    return {
+        "runs": len(durations),
+        "mean_ms": statistics.mean(durations) * 1000,
+        "p50_ms": percentile(durations, 0.5) * 1000,
+        "p90_ms": percentile(durations, 0.9) * 1000,
+        "p99_ms": percentile(durations, 0.99) * 1000,
+        "max_ms": max(durations) * 1000,
+        "queries": max(queries),
+    }
+
+
+def _scenario_calls(name, course_key, users, staff):
+    """
+    Yield one zero-argument callable per iteration of scenario ``name``.
+    """
+    from custom_views.overrides import change_enrollment
+    from custom_views.utils import answered_count, calculate_grade_stats, get_grades
+    from custom_views.views import service_reset_course
+
+    factory = RequestFactory()
+    if name == "answered_count":
+        while True:
+            for user in users:
+                yield lambda user=user: answered_count(user.id, course_key)
+    elif name == "calculate_grade_stats":
+        while True:
+            for user in users:
+                yield lambda user=user: calculate_grade_stats(user.id, course_key)
+    elif name == "get_grades":
+        while True:
+            for user in users:
+                yield lambda user=user: get_grades(str(course_key), user.id)
+    elif name == "service_reset_course":
+        for user in users:
+            request = factory.get("/", {"user_id": user.id, "course_id": str(course_key)})
+            request.user = staff
+            yield lambda request=request: service_reset_course(request)
+    elif name == "change_enrollment_reset":
+        for user in users:
+            request = factory.post("/", {"enrollment_action": "reset", "course_id": str(course_key)})
+            request.user = user
+            yield lambda request=request: change_enrollment(None, request)
+
+
+def run_scenario(name, course_key, users, staff, repeat, warmup=1):
+    durations, queries = [], []
+    calls = _scenario_calls(name, course_key, users, staff)
+    for index, call in enumerate(calls):
+        if index >= warmup + repeat:
+            break
+        with measure() as measured:
+            call()
+        if index >= warmup:
+            durations.append(measured["duration"])
+            queries.append(measured["queries"])
+    return summarize(durations, queries) if durations else None
+
+
+def run_benchmarks(
+    problems=200, learners=100, repeat=20, warmup=1, scenarios=SCENARIOS, allow_any_database=False
+):
+    """
+    Build a synthetic course and return ``{scenario: summary}``.
+
+    Raises UnsafeDatabaseError unless the database is a test database or
+    ``allow_any_database`` is set.
+    """
+    if not allow_any_database and not is_test_database():
+        raise UnsafeDatabaseError(connections[DEFAULT_DB_ALIAS].settings_dict.get("NAME"))
+    course_key = CourseKey.from_string(f"course-v1:Bench+P{problems}+{uuid.uuid4().hex[:8]}")
+    course = build_course(course_key, problems)
+    results = OrderedDict()
+    with transaction.atomic():
+        users = create_learners(course_key, course, learners)
+        staff = get_user_model().objects.create(
+            username=f"bench_staff_{uuid.uuid4().hex[:8]}", is_staff=True
+        )
+        with stand_ins(course):
+            # Reset scenarios delete state: give each its own learners.
+            readers = users
+            for name in scenarios:
+                if name in RESET_SCENARIOS:
+                    count = min(warmup + repeat, len(readers))
+                    scenario_users, readers = readers[:count], readers[count:]
+                else:
+                    scenario_users = readers
+                if not scenario_users:
+                    results[name] = None
+                    continue
+                results[name] = run_scenario(name, course_key, scenario_users, staff, repeat, warmup)
+        transaction.set_rollback(True)
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Return a list of regression messages: a scenario whose p50 grew by more
+    than ``tolerance``, or which runs more queries than the baseline.
+    """
+    regressions = []
+    for name, summary in results.items():
+        expected = baseline.get(name)
+        if not summary or not expected:
+            continue
+        if summary["p50_ms"] > expected["p50_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p50 {summary['p50_ms']:.1f}ms, baseline {expected['p50_ms']:.1f}ms"
+            )
+        if summary["queries"] > expected["queries"]:
+            regressions.append(f"{name}: {summary['queries']} queries, baseline {expected['queries']}")
+    return regressions
@@ -0,0 +1,316 @@
+"""
+Per-course block-structure index used by the reset and grading paths.
+
+Loading a course tree from the modulestore is expensive, and the reset path
+used to do it once per ``StudentModule`` row. The index flattens the published
+course into a dict of plain records, together with the per-block-type count
+of gradable problems, cached under the course's published version so a
+republish naturally invalidates it. Usage keys are stored as strings, and the
+entry is pickled and compressed to stay well under memcached's item size
+limit; records are turned back into usage keys as they are read.
+
+Only problems every learner sees are counted. Children of randomized library
+content and content experiments, and blocks restricted to groups, differ per
+learner: a course holding any of them is flagged ``has_variable_content`` and
+its problem count must come from the learner's own course grade. Problems
+whose start date was still ahead when the index was built are listed with
+it and only counted once it has passed, as ``StartDateTransformer`` does.
+"""
+import logging
+import pickle
+import zlib
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from opaque_keys.edx.keys import UsageKey
+from xmodule.modulestore import ModuleStoreEnum
+from xmodule.modulestore.django import modulestore
+
+log = logging.getLogger(__name__)
+
+DEFAULT_UNCOUNTED_BLOCK_TYPES = ("image-explorer",)
+# Blocks showing each learner only some of their children.
+VARIABLE_CONTAINER_TYPES = ("library_content", "split_test")
+BLOCK_INDEX_CACHE_TIMEOUT = 60 * 60 * 24
+BLOCK_INDEX_KEY = "custom_views.block_index.v3.{course_key}.{version}"
+BLOCK_INDEX_VERSION_KEY = "custom_views.block_index_version.{course_key}"
+
+BlockRecord = namedtuple(
+    "BlockRecord",
+    [
+        "usage_key",
+        "block_type",
+        "children",
+        "has_score",
+        "max_score",
+        "weight",
+        "has_clear_student_state",
+        "group_access",
+        "staff_only",
+        "start",
+    ],
+)
+
+
+def record_for_block(block):
+    """
+    Return a BlockRecord for a loaded block.
+    """
+    has_score = bool(getattr(block, "has_score", False))
+    max_score = None
+    if has_score:
+        try:
+            max_score = block.max_score()
+        except Exception:  # pylint: disable=broad-except
+            log.warning("Could not compute max_score for %s", block.location)
+    return BlockRecord(
+        usage_key=block.location,
+        block_type=block.location.block_type,
+        children=tuple(block.children) if block.has_children else (),
+        has_score=has_score,
+        max_score=max_score,
+        weight=getattr(block, "weight", None),
+        has_clear_student_state=callable(getattr(block, "clear_student_state", None)),
+        group_access=bool(getattr(block, "group_access", None)),
+        staff_only=bool(getattr(block, "visible_to_staff_only", False)),
+        start=getattr(block, "start", None),
+    )
+
+
+def _course_version(course):
+    return str(getattr(course, "course_version", None) or course.subtree_edited_on)
+
+
+def _build_index(course):
+    """
+    Return ``{usage key: BlockRecord}`` for the course, with usage keys as
+    strings throughout.
+    """
+    blocks = {}
+    stack = [course]
+    while stack:
+        block = stack.pop()
+        record = record_for_block(block)
+        blocks[str(block.location)] = record._replace(
+            usage_key=str(record.usage_key), children=tuple(str(child) for child in record.children)
+        )
+        if block.has_children:
+            stack.extend(block.get_children())
+    return blocks
+
+
+def _pack(payload):
+    return zlib.compress(pickle.dumps(payload, pickle.HIGHEST_PROTOCOL))
+
+
+def _unpack(packed):
+    return pickle.loads(zlib.decompress(packed))
+
+
+def _later(start, other):
+    if start is None or other is None:
+        return start or other
+    return max(start, other)
+
+
+def _scored_blocks_by_subsection(blocks, root_key):
+    """
+    Walk every subsection and return ``(problem_counts, subsections,
+    variable, scheduled)``: scored blocks per block type that every learner
+    sees, i.e. the blocks that show up in each subsection grade's
+    ``problem_scores``, a map from each scored block to its subsection,
+    whether some scored blocks are only seen by some learners, and
+    ``(start, block_type)`` for the counted blocks not started yet.
+    """
+    counts = Counter()
+    subsection_of = {}
+    variable = False
+    scheduled = []
+    now = timezone.now()
+    course_record = blocks.get(str(root_key))
+    chapters = course_record.children if course_record else ()
+    seen = set()
+    for chapter in chapters:
+        chapter_record = blocks.get(str(chapter))
+        chapter_start = getattr(chapter_record, "start", None)
+        for subsection in getattr(chapter_record, "children", ()):
+            # (usage key, seen by every learner, latest start of its ancestors)
+            stack = [(subsection, True, chapter_start)]
+            while stack:
+                usage_key, shared, start = stack.pop()
+                usage_key = str(usage_key)
+                if usage_key in seen:
+                    continue
+                seen.add(usage_key)
+                record = blocks.get(usage_key)
+                if record is None or record.staff_only:
+                    continue
+                shared = shared and not record.group_access
+                start = _later(start, record.start)
+                if record.has_score:
+                    subsection_of[usage_key] = str(subsection)
+                    if not shared:
+                        variable = True
+                    else:
+                        counts[record.block_type] += 1
+                        if start is not None and start > now:
+                            scheduled.append((start, record.block_type))
+                children_shared = shared and record.block_type not in VARIABLE_CONTAINER_TYPES
+                stack.extend((child, children_shared, start) for child in record.children)
+    return dict(counts), subsection_of, variable, scheduled
+
+
+class CourseBlockIndex:
+    """
+    Flat, read-only view of a published course keyed by usage key.
+    """
+
+    def __init__(
+        self,
+        course_key,
+        version,
+        blocks,
+        problem_counts=None,
+        subsections=None,
+        has_variable_content=False,
+        scheduled=None,
+    ):
+        self.course_key = course_key
+        self.version = version
+        # String-keyed records, see _build_index; parsed on first read.
+        self._blocks = blocks
+        self._records = {}
+        # Scored blocks per block type, see _scored_blocks_by_subsection.
+        self.problem_counts = problem_counts or {}
+        self._subsections = subsections or {}
+        self.has_variable_content = has_variable_content
+        # (start, block_type) of counted blocks that had not started yet.
+        self.scheduled = scheduled or []
+
+    def get(self, usage_key):
+        """
+        Return the BlockRecord for ``usage_key`` or None if the block is not
+        part of the published course tree.
+        """
+        usage_key = str(usage_key)
+        record = self._records.get(usage_key)
+        if record is None:
+            record = self._blocks.get(usage_key)
+            if record is None:
+                return None
+            record = record._replace(
+                usage_key=UsageKey.from_string(record.usage_key),
+                children=tuple(UsageKey.from_string(child) for child in record.children),
+            )
+            self._records[usage_key] = record
+        return record
+
+    def __contains__(self, usage_key):
+        return str(usage_key) in self._blocks
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def subsection_for(self, usage_key):
+        """
+        Return the usage key of the subsection grading ``usage_key``, if any.
+        """
+        subsection = self._subsections.get(str(usage_key))
+        return UsageKey.from_string(subsection) if subsection is not None else None
+
+    def countable_problem_count(self):
+        """
+        Number of problems every learner sees on the progress page, excluding
+        block types listed in ``CUSTOM_VIEWS_UNCOUNTED_BLOCK_TYPES`` and
+        problems not started yet. With ``has_variable_content`` learners see
+        more problems than this.
+        """
+        uncounted = getattr(settings, "CUSTOM_VIEWS_UNCOUNTED_BLOCK_TYPES", DEFAULT_UNCOUNTED_BLOCK_TYPES)
+        now = timezone.now()
+        not_started = sum(
+            1 for start, block_type in self.scheduled if start > now and block_type not in uncounted
+        )
+        return sum(
+            count for block_type, count in self.problem_counts.items() if block_type not in uncounted
+        ) - not_started
+
+
+def build_block_index(course_key):
+    """
+    Load the published course once and store its index in the cache.
+
+    The version pointer is only moved once the index itself is stored, so a
+    failed store does not make every later read rebuild the index.
+    """
+    store = modulestore()
+    with store.branch_setting(ModuleStoreEnum.Branch.published_only, course_key), \
+            store.bulk_operations(course_key):
+        course = store.get_course(course_key, depth=None)
+        if course is None:
+            return CourseBlockIndex(course_key, None, {})
+        version = _course_version(course)
+        blocks = _build_index(course)
+        problem_counts, subsections, variable, scheduled = _scored_blocks_by_subsection(blocks, course.location)
+    packed = _pack(
+        {
+            "blocks": blocks,
+            "problem_counts": problem_counts,
+            "subsections": subsections,
+            "variable": variable,
+            "scheduled": scheduled,
+        }
+    )
+    # Unlike ``set``, ``set_many`` reports the keys it failed to store.
+    failed = cache.set_many(
+        {BLOCK_INDEX_KEY.format(course_key=course_key, version=version): packed}, BLOCK_INDEX_CACHE_TIMEOUT
+    )
+    if failed:
+        log.warning(
+            "Could not cache block index for %s (version %s, %d bytes)", course_key, version, len(packed)
+        )
+    else:
+        cache.set(
+            BLOCK_INDEX_VERSION_KEY.format(course_key=course_key),
+            version,
+            BLOCK_INDEX_CACHE_TIMEOUT,
+        )
+    log.info("Built block index for %s (version %s, %d blocks)", course_key, version, len(blocks))
+    return CourseBlockIndex(course_key, version, blocks, problem_counts, subsections, variable, scheduled)
+
+
+def get_block_index(course_key):
+    """
+    Return the cached CourseBlockIndex for ``course_key``, building it if the
+    current published version has not been indexed yet.
+    """
+    version = cache.get(BLOCK_INDEX_VERSION_KEY.format(course_key=course_key))
+    if version is not None:
+        packed = cache.get(BLOCK_INDEX_KEY.format(course_key=course_key, version=version))
+        if packed is not None:
+            cached = _unpack(packed)
+            return CourseBlockIndex(
+                course_key,
+                version,
+                cached["blocks"],
+                cached["problem_counts"],
+                cached["subsections"],
+                cached["variable"],
+                cached["scheduled"],
+            )
+    return build_block_index(course_key)
+
+
+def get_course_version(course_key):
+    """
+    Return the published version of ``course_key`` without loading its index.
+    """
+    version = cache.get(BLOCK_INDEX_VERSION_KEY.format(course_key=course_key))
+    if version is None:
+        version = build_block_index(course_key).version
+    return version
+
+
+def invalidate_block_index(course_key):
+    cache.delete(BLOCK_INDEX_VERSION_KEY.format(course_key=course_key))
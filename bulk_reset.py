@@ -0,0 +1,223 @@
+"""
+Administrative course resets for many learners at once.
+
+A ``BulkResetRun`` is split into chunks of learners. Chunks run in a process
+pool from the management command, or sequentially in a background thread
+from the API. Each learner gets a ``ResetJob`` linked to the run, so an
+interrupted run resumes where it stopped.
+"""
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.utils import timezone
+
+from custom_views.models import BulkResetRun, ResetJob
+from custom_views.progress_counters import record_reset
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BULK_RESET_CHUNK_SIZE = 50
+
+
+class Throttle:
+    """
+    Keep a worker under ``rows_per_second`` deleted StudentModule rows.
+    """
+
+    def __init__(self, rows_per_second):
+        self.rows_per_second = rows_per_second
+        self.started = time.monotonic()
+        self.rows = 0
+
+    def add(self, rows):
+        if not self.rows_per_second:
+            return
+        self.rows += rows
+        expected_elapsed = self.rows / self.rows_per_second
+        elapsed = time.monotonic() - self.started
+        if expected_elapsed > elapsed:
+            time.sleep(expected_elapsed - elapsed)
+
+
+def resolve_user_ids(course_key, user_ids=None, usernames=None, cohort=None):
+    """
+    Return ``(scope, user_ids)`` for the learners to reset: the given users,
+    a cohort's members, or every active enrollment when nothing is given.
+    Only learners enrolled in the course are kept.
+    """
+    from common.djangoapps.student.models import CourseEnrollment
+    from django.contrib.auth import get_user_model
+
+    enrolled = CourseEnrollment.objects.filter(course_id=course_key, is_active=True)
+    if cohort:
+        from openedx.core.djangoapps.course_groups.models import CourseUserGroup
+
+        scope = f"cohort:{cohort}"
+        enrolled = enrolled.filter(
+            user__course_groups__course_id=course_key,
+            user__course_groups__group_type=CourseUserGroup.COHORT,
+            user__course_groups__name=cohort,
+        )
+    elif user_ids or usernames:
+        scope = "users"
+        ids = set(user_ids or [])
+        if usernames:
+            ids.update(
+                get_user_model().objects.filter(username__in=usernames).values_list("id", flat=True)
+            )
+        enrolled = enrolled.filter(user_id__in=ids)
+    else:
+        scope = "all"
+    return scope, list(enrolled.order_by("user_id").values_list("user_id", flat=True))
+
+
+def create_bulk_reset_run(course_key, user_ids, scope, requested_by=None):
+    """
+    Create a run and one pending ResetJob per learner; the jobs are the
+    run's checkpoint.
+    """
+    run = BulkResetRun.objects.create(
+        course_id=course_key, scope=scope, total=len(user_ids), requested_by=requested_by
+    )
+    ResetJob.objects.bulk_create(
+        [
+            ResetJob(bulk_run=run, user_id=user_id, course_id=course_key, requested_by=requested_by)
+            for user_id in user_ids
+        ],
+        batch_size=1000,
+    )
+    return run
+
+
+def pending_user_ids(run):
+    """
+    Learners of ``run`` whose reset has not succeeded yet.
+    """
+    return list(
+        ResetJob.objects.filter(bulk_run=run)
+        .exclude(status=ResetJob.SUCCEEDED)
+        .order_by("user_id")
+        .values_list("user_id", flat=True)
+    )
+
+
+def reset_chunk(run_id, user_ids, rows_per_second=None):
+    """
+    Reset one chunk of learners of a run. Returns ``(succeeded, failed)``
+    user id lists for learners processed by this call.
+    """
+    from custom_views.jobs import run_reset_job
+
+    run = BulkResetRun.objects.get(run_id=run_id)
+    jobs = {job.user_id: job for job in ResetJob.objects.filter(bulk_run=run, user_id__in=user_ids)}
+    missing = [user_id for user_id in user_ids if user_id not in jobs]
+    if missing:
+        ResetJob.objects.bulk_create(
+            [
+                ResetJob(bulk_run=run, user_id=user_id, course_id=run.course_id, requested_by_id=run.requested_by_id)
+                for user_id in missing
+            ]
+        )
+        jobs.update(
+            (job.user_id, job) for job in ResetJob.objects.filter(bulk_run=run, user_id__in=missing)
+        )
+    count_chunk_resets(run, user_ids)
+
+    throttle = Throttle(rows_per_second)
+    succeeded, failed = [], []
+    for user_id in user_ids:
+        job = jobs[user_id]
+        if job.status == ResetJob.SUCCEEDED:
+            continue
+        try:
+            job = run_reset_job(job.job_id)
+        except Exception as exc:  # pylint: disable=broad-except
+            log.exception("Bulk reset %s failed for user %s", run_id, user_id)
+            ResetJob.objects.filter(id=job.id).update(
+                status=ResetJob.FAILED, error=str(exc), modified=timezone.now()
+            )
+            failed.append(user_id)
+            continue
+        if job.status == ResetJob.SUCCEEDED:
+            succeeded.append(user_id)
+        throttle.add(job.modules_processed)
+    BulkResetRun.objects.filter(id=run.id).update(modified=timezone.now())
+    return succeeded, failed
+
+
+def count_chunk_resets(run, user_ids):
+    """
+    Count the reset of every learner of the chunk not counted yet, with one
+    EmployeeResetCount update for the chunk. The jobs are marked as counted
+    in the same transaction, so a chunk retried after a crash is not counted
+    twice and ``run_reset_job`` does not count them again.
+    """
+    from common.djangoapps.student.models import CourseEnrollment
+    from custom_views.analytics import bulk_increment_reset_counts
+
+    with transaction.atomic():
+        uncounted = list(
+            ResetJob.objects.select_for_update()
+            .filter(bulk_run=run, user_id__in=user_ids, counted=False)
+            .values_list("id", "user_id")
+        )
+        if not uncounted:
+            return
+        uncounted_user_ids = [user_id for _, user_id in uncounted]
+        for user_id in uncounted_user_ids:
+            record_reset(user_id, run.course_id)
+        bulk_increment_reset_counts(
+            list(
+                CourseEnrollment.objects.filter(
+                    course_id=run.course_id, user_id__in=uncounted_user_ids
+                ).values_list("id", flat=True)
+            )
+        )
+        ResetJob.objects.filter(id__in=[job_id for job_id, _ in uncounted]).update(counted=True)
+
+
+def _init_worker():
+    """
+    Drop clients inherited from the parent process: forked workers must not
+    share its database, cache or MongoDB sockets.
+    """
+    from xmodule.modulestore.django import clear_existing_modulestores
+
+    connections.close_all()
+    for cache in caches.all():
+        cache.close()
+    clear_existing_modulestores()
+
+
+def execute_bulk_reset_run(run, processes=0, chunk_size=None, rows_per_second=None):
+    """
+    Reset every pending learner of ``run``, ``processes`` chunks at a time
+    (0 runs chunks in the current process), and return the run summary.
+    ``rows_per_second`` is a global budget shared between the processes.
+    """
+    chunk_size = chunk_size or getattr(
+        settings, "CUSTOM_VIEWS_BULK_RESET_CHUNK_SIZE", DEFAULT_BULK_RESET_CHUNK_SIZE
+    )
+    BulkResetRun.objects.filter(id=run.id).update(status=BulkResetRun.RUNNING)
+    user_ids = pending_user_ids(run)
+    chunks = [user_ids[start:start + chunk_size] for start in range(0, len(user_ids), chunk_size)]
+    if processes:
+        worker_rate = rows_per_second / processes if rows_per_second else None
+        # Workers reconnect on their own; close the parent's connections so
+        # the forked copies are never used.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker) as pool:
+            futures = [pool.submit(reset_chunk, run.run_id, chunk, worker_rate) for chunk in chunks]
+            for future in as_completed(futures):
+                succeeded, failed = future.result()
+                log.info("Bulk reset %s: chunk done, %d ok, %d failed", run.run_id, len(succeeded), len(failed))
+    else:
+        for chunk in chunks:
+            reset_chunk(run.run_id, chunk, rows_per_second)
+    BulkResetRun.objects.filter(id=run.id).update(status=BulkResetRun.FINISHED)
+    run.refresh_from_db()
+    return run.summary()
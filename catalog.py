@@ -0,0 +1,96 @@
+"""
+Cached catalog of visible courses.
+
+``get_visible_courses`` loads every CourseOverview on each call. The catalog
+keeps lightweight projections of the visible courses in the cache, with an
+index by org, under a version token that is bumped on course publish. The
+entry is pickled and compressed to stay under memcached's item size limit.
+"""
+import logging
+import pickle
+import zlib
+
+from django.core.cache import cache
+
+log = logging.getLogger(__name__)
+
+CATALOG_CACHE_TIMEOUT = 60 * 60
+CATALOG_KEY = "custom_views.catalog.v2.{version}.{site_orgs}"
+CATALOG_VERSION_KEY = "custom_views.catalog_version"
+
+
+def course_projection(course):
+    """
+    The fields exposed by the course list API.
+    """
+    return {
+        "id": str(course.id),
+        "org": course.display_org_with_default,
+        "number": course.display_number_with_default,
+        "name": course.display_name_with_default,
+        "start": course.start.isoformat() if course.start else None,
+        "end": course.end.isoformat() if course.end else None,
+        "enrollment_start": course.enrollment_start.isoformat() if course.enrollment_start else None,
+        "enrollment_end": course.enrollment_end.isoformat() if course.enrollment_end else None,
+        "course_image_url": course.course_image_url,
+        "invitation_only": course.invitation_only,
+    }
+
+
+def _catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(CATALOG_VERSION_KEY, version, None)
+    return version
+
+
+def invalidate_catalog():
+    """
+    Drop every cached catalog by moving to a new version.
+    """
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, 2, None)
+
+
+def _site_orgs():
+    from openedx.core.djangoapps.site_configuration import helpers as configuration_helpers
+
+    org_filter = configuration_helpers.get_value("course_org_filter")
+    if not org_filter:
+        return "all"
+    if isinstance(org_filter, str):
+        return org_filter
+    return ",".join(sorted(org_filter))
+
+
+def _build_catalog():
+    from lms.djangoapps.branding import get_visible_courses
+
+    courses = []
+    by_org = {}
+    for position, course in enumerate(get_visible_courses()):
+        courses.append(course_projection(course))
+        # Keyed like get_visible_courses(org=...) filters: on the course key's
+        # org, not the display organization.
+        by_org.setdefault(str(course.id.org).lower(), []).append(position)
+    return {"courses": courses, "by_org": by_org}
+
+
+def get_course_catalog(org=None):
+    """
+    Return the visible course projections for the current site, optionally
+    restricted to ``org``, sorted as ``get_visible_courses`` sorts them.
+    """
+    key = CATALOG_KEY.format(version=_catalog_version(), site_orgs=_site_orgs())
+    packed = cache.get(key)
+    if packed is None:
+        catalog = _build_catalog()
+        cache.set(key, zlib.compress(pickle.dumps(catalog, pickle.HIGHEST_PROTOCOL)), CATALOG_CACHE_TIMEOUT)
+    else:
+        catalog = pickle.loads(zlib.decompress(packed))
+    if org is None:
+        return catalog["courses"]
+    return [catalog["courses"][position] for position in catalog["by_org"].get(org.lower(), [])]
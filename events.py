@@ -0,0 +1,60 @@
+"""
+Tracking events for course resets, deferred until their data is committed.
+"""
+import logging
+
+from common.djangoapps.track.event_transaction_utils import (
+    create_new_event_transaction_id,
+    set_event_transaction_type,
+)
+from django.db import transaction
+from eventtracking import tracker
+
+log = logging.getLogger(__name__)
+
+
+class BufferedEventEmitter:
+    """
+    Collect tracking events for one operation under a single event
+    transaction id and emit them once the database work they describe has
+    been committed. The tracker has no bulk API, so each event is still
+    emitted on its own.
+
+    Events buffered in an atomic block that rolls back are dropped along
+    with the ``on_commit`` callback that would have emitted them.
+    """
+
+    def __init__(self, event_type):
+        self.event_type = event_type
+        self.event_transaction_id = str(create_new_event_transaction_id())
+        set_event_transaction_type(event_type)
+        self._buffer = []
+        self.emitted = 0
+
+    def add(self, data):
+        data = dict(
+            data,
+            event_transaction_id=self.event_transaction_id,
+            event_transaction_type=self.event_type,
+        )
+        self._buffer.append(data)
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def flush_on_commit(self):
+        """
+        Hand the buffered events to ``transaction.on_commit``.
+        """
+        if not self._buffer:
+            return
+        events, self._buffer = self._buffer, []
+        transaction.on_commit(lambda: self._emit(events))
+
+    def _emit(self, events):
+        for data in events:
+            try:
+                tracker.emit(self.event_type, data)
+            except Exception:  # pylint: disable=broad-except
+                log.exception("Failed to emit %s event", self.event_type)
+        self.emitted += len(events)
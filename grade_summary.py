@@ -0,0 +1,69 @@
+"""
+Compact, structured serialization of a course grade's courseware summary.
+
+Detail levels:
+
+* ``course``: no summary; the course totals are already part of the grade
+  details. ``chapter_grades`` is not touched, so no subsection grade is built.
+* ``section``: chapters and their subsections with earned/possible totals.
+* ``problem``: the above plus each subsection's problem scores.
+"""
+DETAIL_COURSE = "course"
+DETAIL_SECTION = "section"
+DETAIL_PROBLEM = "problem"
+DETAIL_LEVELS = (DETAIL_COURSE, DETAIL_SECTION, DETAIL_PROBLEM)
+DEFAULT_DETAIL = DETAIL_SECTION
+
+
+def _round(value):
+    return round(value, 4) if value is not None else None
+
+
+def _problem_scores(subsection_grade):
+    return [
+        {
+            "id": str(usage_key),
+            "earned": _round(score.earned),
+            "possible": _round(score.possible),
+            "graded": score.graded,
+        }
+        for usage_key, score in subsection_grade.problem_scores.items()
+    ]
+
+
+def _subsection(subsection_grade, detail):
+    all_total = subsection_grade.all_total
+    graded_total = subsection_grade.graded_total
+    serialized = {
+        "id": str(subsection_grade.location),
+        "name": subsection_grade.display_name,
+        "format": subsection_grade.format,
+        "graded": subsection_grade.graded,
+        "due": subsection_grade.due.isoformat() if subsection_grade.due else None,
+        "earned": _round(all_total.earned),
+        "possible": _round(all_total.possible),
+        "graded_earned": _round(graded_total.earned),
+        "graded_possible": _round(graded_total.possible),
+    }
+    if detail == DETAIL_PROBLEM:
+        serialized["problems"] = _problem_scores(subsection_grade)
+    return serialized
+
+
+def serialize_courseware_summary(course_grade, detail=DEFAULT_DETAIL):
+    """
+    Return the courseware summary of ``course_grade`` at ``detail`` level as
+    JSON-serializable data, or None for the ``course`` level.
+    """
+    if detail not in DETAIL_LEVELS:
+        raise ValueError(f"Unknown detail level: {detail}")
+    if detail == DETAIL_COURSE:
+        return None
+    return [
+        {
+            "name": chapter["display_name"],
+            "url_name": chapter["url_name"],
+            "sections": [_subsection(section, detail) for section in chapter["sections"]],
+        }
+        for chapter in course_grade.chapter_grades.values()
+    ]
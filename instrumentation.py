@@ -0,0 +1,277 @@
+"""
+Per-phase instrumentation of the reset, progress and grades paths.
+
+An operation (``instrument``) records the wall time and number of database
+queries of each named ``phase`` run inside it, plus free-form counters such
+as the number of modules touched. Operations started while another one is
+running in the same thread are recorded as a phase of the outer one. A phase
+run inside another phase is named after both, e.g. ``get_grades.course``.
+
+Finished operations are handed to the sinks listed in
+``CUSTOM_VIEWS_METRICS_SINKS`` (dotted paths of classes with an
+``emit(trace)`` method). With ``CUSTOM_VIEWS_SERVER_TIMING`` the phases of
+instrumented views are also reported in a ``Server-Timing`` header.
+"""
+import functools
+import logging
+import socket
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+log = logging.getLogger(__name__)
+
+DEFAULT_METRICS_SINKS = ("custom_views.instrumentation.LoggingSink",)
+
+_local = threading.local()
+
+
+class PhaseStats:
+    """
+    Accumulated time and queries of one phase; a phase may run many times.
+    """
+
+    def __init__(self):
+        self.duration = 0.0
+        self.queries = 0
+        self.calls = 0
+
+    def to_dict(self):
+        return {"duration": self.duration, "queries": self.queries, "calls": self.calls}
+
+
+class Trace:
+    """
+    Measurements of one instrumented operation.
+    """
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.duration = 0.0
+        self.queries = 0
+        self.phases = OrderedDict()
+        self.counters = {}
+
+    def incr(self, counter, value=1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def to_dict(self):
+        return {
+            "operation": self.operation,
+            "duration": self.duration,
+            "queries": self.queries,
+            "phases": {name: stats.to_dict() for name, stats in self.phases.items()},
+            "counters": dict(self.counters),
+        }
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def measure():
+    """
+    Yield a dict filled with the block's ``duration`` and ``queries``.
+    """
+    counter = _QueryCounter()
+    measured = {}
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        try:
+            yield measured
+        finally:
+            measured["duration"] = time.perf_counter() - started
+            measured["queries"] = counter.count
+
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def phase(name):
+    """
+    Record the block as phase ``name`` of the current operation, if any.
+    """
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    parent = getattr(_local, "phase", None)
+    if parent is not None:
+        name = f"{parent}.{name}"
+    _local.phase = name
+    try:
+        with measure() as measured:
+            yield
+    finally:
+        _local.phase = parent
+    stats = trace.phases.setdefault(name, PhaseStats())
+    stats.duration += measured["duration"]
+    stats.queries += measured["queries"]
+    stats.calls += 1
+
+
+def incr(counter, value=1):
+    """
+    Add ``value`` to a counter of the current operation, if any.
+    """
+    trace = current_trace()
+    if trace is not None:
+        trace.incr(counter, value)
+
+
+@contextmanager
+def instrument(operation):
+    """
+    Record the block as ``operation`` and emit it to the sinks when it ends.
+    Yields the Trace, or None when nested in another operation.
+    """
+    if current_trace() is not None:
+        with phase(operation):
+            yield None
+        return
+    trace = Trace(operation)
+    _local.trace = trace
+    try:
+        with measure() as measured:
+            yield trace
+    finally:
+        _local.trace = None
+        trace.duration = measured["duration"]
+        trace.queries = measured["queries"]
+        emit(trace)
+
+
+def instrumented(operation):
+    """
+    Decorate a view (or view override) to run it as an instrumented
+    operation and report its phases in a ``Server-Timing`` header.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with instrument(operation) as trace:
+                response = func(*args, **kwargs)
+            if trace is not None:
+                add_server_timing(response, trace)
+            return response
+        return wrapper
+    return decorator
+
+
+def add_server_timing(response, trace):
+    if not getattr(settings, "CUSTOM_VIEWS_SERVER_TIMING", False) or not hasattr(response, "has_header"):
+        return
+    entries = [f'{name};dur={stats.duration * 1000:.1f};desc="{stats.queries} queries"'
+               for name, stats in trace.phases.items()]
+    entries.append(f'total;dur={trace.duration * 1000:.1f};desc="{trace.queries} queries"')
+    if response.has_header("Server-Timing"):
+        entries.insert(0, response["Server-Timing"])
+    response["Server-Timing"] = ", ".join(entries)
+
+
+class LoggingSink:
+    """
+    Log one line per operation.
+    """
+
+    def emit(self, trace):
+        log.info("custom_views timing: %s", trace.to_dict())
+
+
+class StatsdSink:
+    """
+    Send timings and counters as StatsD datagrams over UDP.
+    """
+
+    def __init__(self):
+        self.address = (
+            getattr(settings, "CUSTOM_VIEWS_STATSD_HOST", "localhost"),
+            getattr(settings, "CUSTOM_VIEWS_STATSD_PORT", 8125),
+        )
+        self.prefix = getattr(settings, "CUSTOM_VIEWS_STATSD_PREFIX", "custom_views")
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _lines(self, trace):
+        base = f"{self.prefix}.{trace.operation}"
+        yield f"{base}.duration:{trace.duration * 1000:.3f}|ms"
+        yield f"{base}.queries:{trace.queries}|ms"
+        for name, stats in trace.phases.items():
+            yield f"{base}.{name}.duration:{stats.duration * 1000:.3f}|ms"
+            yield f"{base}.{name}.queries:{stats.queries}|ms"
+        for counter, value in trace.counters.items():
+            yield f"{base}.{counter}:{value}|c"
+
+    def emit(self, trace):
+        try:
+            self.socket.sendto("\n".join(self._lines(trace)).encode("utf-8"), self.address)
+        except OSError:
+            log.warning("Could not send metrics for %s", trace.operation)
+
+
+class MonitoringSink:
+    """
+    Attach the measurements to the current transaction of the APM agent.
+    """
+
+    def emit(self, trace):
+        from edx_django_utils.monitoring import set_custom_attribute
+
+        prefix = f"custom_views.{trace.operation}"
+        set_custom_attribute(f"{prefix}.duration", trace.duration)
+        set_custom_attribute(f"{prefix}.queries", trace.queries)
+        for name, stats in trace.phases.items():
+            set_custom_attribute(f"{prefix}.{name}.duration", stats.duration)
+            set_custom_attribute(f"{prefix}.{name}.queries", stats.queries)
+        for counter, value in trace.counters.items():
+            set_custom_attribute(f"{prefix}.{counter}", value)
+
+
+class MemorySink:
+    """
+    Keep finished traces in memory, for tests and benchmarks.
+    """
+
+    traces = []
+
+    def emit(self, trace):
+        MemorySink.traces.append(trace)
+
+    @classmethod
+    def clear(cls):
+        del cls.traces[:]
+
+
+_sinks = None
+_sinks_setting = None
+
+
+def get_sinks():
+    global _sinks, _sinks_setting  # pylint: disable=global-statement
+    paths = tuple(getattr(settings, "CUSTOM_VIEWS_METRICS_SINKS", DEFAULT_METRICS_SINKS))
+    if _sinks is None or paths != _sinks_setting:
+        _sinks = [import_string(path)() for path in paths]
+        _sinks_setting = paths
+    return _sinks
+
+
+def emit(trace):
+    for sink in get_sinks():
+        try:
+            sink.emit(trace)
+        except Exception:  # pylint: disable=broad-except
+            log.exception("Metrics sink %r failed", sink)
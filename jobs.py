@@ -0,0 +1,215 @@
+"""
+Background execution of course resets.
+
+Resets are stored as ``ResetJob`` rows and run by a process-local thread
+pool, so the HTTP request only has to create the job. With
+``CUSTOM_VIEWS_RESET_JOBS_EAGER`` (used in tests) jobs run in-process before
+``submit_reset_job`` returns.
+
+Every write to a running job also moves its ``modified`` timestamp: a job
+whose heartbeat is older than ``CUSTOM_VIEWS_RESET_JOB_STALE_AFTER`` seconds
+is considered dead and may be resumed. A worker claims a job with a
+conditional update, so only one worker runs it at a time.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from custom_views.models import BulkResetRun, ResetJob
+from custom_views.progress_counters import record_reset
+
+log = logging.getLogger(__name__)
+
+DEFAULT_RESET_JOB_WORKERS = 2
+DEFAULT_RESET_JOB_STALE_AFTER = 15 * 60
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "CUSTOM_VIEWS_RESET_JOB_WORKERS", DEFAULT_RESET_JOB_WORKERS),
+                thread_name_prefix="custom-views-reset",
+            )
+        return _executor
+
+
+def _is_stale(job):
+    stale_after = getattr(settings, "CUSTOM_VIEWS_RESET_JOB_STALE_AFTER", DEFAULT_RESET_JOB_STALE_AFTER)
+    return job.modified < timezone.now() - timedelta(seconds=stale_after)
+
+
+def _update_job(job_id, **values):
+    """
+    Update a job and its heartbeat; ``QuerySet.update`` skips ``auto_now``.
+    """
+    return ResetJob.objects.filter(id=job_id).update(modified=timezone.now(), **values)
+
+
+def _claim_job(job):
+    """
+    Mark ``job`` as running by this worker. False when another worker changed
+    it since it was read.
+    """
+    return bool(
+        ResetJob.objects.filter(id=job.id, status=job.status, modified=job.modified).update(
+            status=ResetJob.RUNNING, attempts=F("attempts") + 1, error="", modified=timezone.now()
+        )
+    )
+
+
+def _run_job(job_id):
+    try:
+        run_reset_job(job_id)
+    except Exception as exc:  # pylint: disable=broad-except
+        log.exception("Reset job %s failed", job_id)
+        ResetJob.objects.filter(job_id=job_id).update(
+            status=ResetJob.FAILED, error=str(exc), modified=timezone.now()
+        )
+
+
+def _run_in_worker(job_id):
+    close_old_connections()
+    try:
+        _run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def enqueue_reset_job(job):
+    if getattr(settings, "CUSTOM_VIEWS_RESET_JOBS_EAGER", False):
+        # Runs in the caller's connection and transaction.
+        _run_job(job.job_id)
+        return
+    # The worker must not start before the job row is visible to it.
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_worker, job.job_id))
+
+
+def submit_reset_job(course_key, user, requesting_user=None):
+    """
+    Create (or reuse) the reset job for ``user`` in ``course_key`` and queue it.
+
+    Returns ``(job, created)``. An unfinished job for the same enrollment is
+    returned instead of creating a new one; it is re-queued if its worker
+    appears to have died. Jobs of bulk runs are left to their run.
+    """
+    job = (
+        ResetJob.objects.filter(
+            user=user, course_id=course_key, status__in=ResetJob.UNFINISHED_STATUSES, bulk_run__isnull=True
+        )
+        .order_by("-created")
+        .first()
+    )
+    if job is not None:
+        if _is_stale(job):
+            enqueue_reset_job(job)
+        return job, False
+    job = ResetJob.objects.create(user=user, course_id=course_key, requested_by=requesting_user)
+    enqueue_reset_job(job)
+    job.refresh_from_db()
+    return job, True
+
+
+def _run_bulk(run_id):
+    from custom_views.bulk_reset import execute_bulk_reset_run
+
+    try:
+        execute_bulk_reset_run(BulkResetRun.objects.get(run_id=run_id))
+    except Exception:  # pylint: disable=broad-except
+        log.exception("Bulk reset run %s failed", run_id)
+
+
+def _run_bulk_in_worker(run_id):
+    close_old_connections()
+    try:
+        _run_bulk(run_id)
+    finally:
+        close_old_connections()
+
+
+def enqueue_bulk_reset_run(run):
+    """
+    Run a BulkResetRun on the reset worker pool, chunks one after another.
+    """
+    if getattr(settings, "CUSTOM_VIEWS_RESET_JOBS_EAGER", False):
+        _run_bulk(run.run_id)
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run_bulk_in_worker, run.run_id))
+
+
+def run_reset_job(job_id):
+    """
+    Execute, or resume, a reset job. Does nothing when the job succeeded or
+    another worker is running it.
+    """
+    from custom_views.reset import execute_course_reset, plan_course_reset
+
+    job = ResetJob.objects.select_related("user", "requested_by").get(job_id=job_id)
+    if job.status == ResetJob.SUCCEEDED:
+        return job
+    if job.status == ResetJob.RUNNING and not _is_stale(job):
+        return job
+    if not _claim_job(job):
+        log.info("Reset job %s was claimed by another worker", job_id)
+        job.refresh_from_db()
+        return job
+
+    if not job.counted:
+        with transaction.atomic():
+            record_reset(job.user_id, job.course_id)
+            _update_job(job.id, counted=True)
+
+    # Rows deleted by an earlier attempt are gone, so the plan only covers
+    # what is left to do, and the subsections they affected are unknown.
+    resuming = job.attempts > 0
+    already_processed = job.modules_processed
+    plan = plan_course_reset(job.course_id, job.user)
+    _update_job(job.id, modules_total=already_processed + len(plan))
+
+    def on_progress(result):
+        _update_job(
+            job.id,
+            modules_processed=already_processed + result.modules_deleted,
+            failures=len(result.failures),
+        )
+
+    result = execute_course_reset(
+        plan,
+        requesting_user=job.requested_by,
+        on_progress=on_progress,
+        record=False,
+        full_regrade=resuming,
+    )
+    _update_job(
+        job.id,
+        status=ResetJob.SUCCEEDED,
+        modules_processed=already_processed + result.modules_deleted,
+        failures=len(result.failures),
+    )
+    job.refresh_from_db()
+    return job
+
+
+def resume_stale_jobs():
+    """
+    Re-queue unfinished jobs whose worker stopped reporting progress. Jobs
+    of bulk runs are left out: ``bulk_reset_course --resume`` runs them
+    throttled and counted per chunk.
+    """
+    resumed = 0
+    unfinished = ResetJob.objects.filter(status__in=ResetJob.UNFINISHED_STATUSES, bulk_run__isnull=True)
+    for job in unfinished.iterator():
+        if _is_stale(job):
+            enqueue_reset_job(job)
+            resumed += 1
+    return resumed
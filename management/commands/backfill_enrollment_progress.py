@@ -0,0 +1,58 @@
+"""
+Populate EnrollmentProgress counters for existing enrollments.
+
+    ./manage.py lms backfill_enrollment_progress --course-id course-v1:Org+Num+Run --chunk-size 500
+"""
+import logging
+import time
+
+from common.djangoapps.student.models import CourseEnrollment
+from django.core.management.base import BaseCommand
+from opaque_keys.edx.keys import CourseKey
+
+from custom_views.progress_counters import recompute_progress
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Backfill per-enrollment answered/reset counters in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--course-id", dest="course_id", help="Only backfill this course.")
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--start-id",
+            type=int,
+            default=0,
+            help="Resume from this CourseEnrollment id (printed after every chunk).",
+        )
+        parser.add_argument(
+            "--sleep", type=float, default=0.0, help="Seconds to pause between chunks."
+        )
+
+    def handle(self, *args, **options):
+        enrollments = CourseEnrollment.objects.filter(is_active=True)
+        if options["course_id"]:
+            enrollments = enrollments.filter(course_id=CourseKey.from_string(options["course_id"]))
+        last_id = options["start_id"]
+        processed = 0
+        while True:
+            chunk = list(
+                enrollments.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", "user_id", "course_id")[:options["chunk_size"]]
+            )
+            if not chunk:
+                break
+            for _, user_id, course_id in chunk:
+                try:
+                    recompute_progress(user_id, course_id)
+                except Exception:  # pylint: disable=broad-except
+                    log.exception("Failed to backfill progress for user %s in %s", user_id, course_id)
+            last_id = chunk[-1][0]
+            processed += len(chunk)
+            self.stdout.write(f"Processed {processed} enrollments, last id {last_id}")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {processed} enrollments"))
@@ -0,0 +1,85 @@
+"""
+Benchmark the reset, progress and grades paths on a synthetic course.
+
+    ./manage.py lms benchmark_custom_views --problems 500 --learners 200 --repeat 50
+    ./manage.py lms benchmark_custom_views --save-baseline /tmp/custom_views_baseline.json
+    ./manage.py lms benchmark_custom_views --baseline /tmp/custom_views_baseline.json
+
+The synthetic data is rolled back when the command ends. The command only
+runs against a test database unless ``--i-know`` is given. With ``--baseline``
+the command fails when a scenario regressed, see
+``benchmark.compare_to_baseline``.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from custom_views.benchmark import (
+    DEFAULT_TOLERANCE,
+    SCENARIOS,
+    UnsafeDatabaseError,
+    compare_to_baseline,
+    run_benchmarks,
+)
+
+
+class Command(BaseCommand):
+    help = "Time the plugin's reset, progress and grades paths on a synthetic course."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--problems", type=int, default=200, help="Problems in the synthetic course.")
+        parser.add_argument("--learners", type=int, default=100, help="Enrolled learners.")
+        parser.add_argument("--repeat", type=int, default=20, help="Measured runs per scenario.")
+        parser.add_argument("--warmup", type=int, default=1, help="Unmeasured runs per scenario.")
+        parser.add_argument(
+            "--scenario", action="append", choices=SCENARIOS, help="Only run this scenario (repeatable)."
+        )
+        parser.add_argument("--baseline", help="JSON results to compare against.")
+        parser.add_argument("--save-baseline", dest="save_baseline", help="Write the results to this file.")
+        parser.add_argument(
+            "--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed relative p50 increase."
+        )
+        parser.add_argument(
+            "--i-know",
+            dest="i_know",
+            action="store_true",
+            help="Run even if the database is not a test database, e.g. production.",
+        )
+
+    def handle(self, *args, **options):
+        if not 10 <= options["problems"] <= 2000:
+            raise CommandError("--problems must be between 10 and 2000")
+        if not 1 <= options["learners"] <= 10000:
+            raise CommandError("--learners must be between 1 and 10000")
+        try:
+            results = run_benchmarks(
+                problems=options["problems"],
+                learners=options["learners"],
+                repeat=options["repeat"],
+                warmup=options["warmup"],
+                scenarios=options["scenario"] or SCENARIOS,
+                allow_any_database=options["i_know"],
+            )
+        except UnsafeDatabaseError as exc:
+            raise CommandError(
+                f"Refusing to write benchmark data to database {exc}, which is not a test database; "
+                "pass --i-know to run anyway"
+            ) from exc
+        for name, summary in results.items():
+            if summary is None:
+                self.stdout.write(self.style.WARNING(f"{name}: skipped, not enough learners"))
+                continue
+            self.stdout.write(
+                f"{name}: p50 {summary['p50_ms']:.1f}ms p90 {summary['p90_ms']:.1f}ms "
+                f"p99 {summary['p99_ms']:.1f}ms max {summary['max_ms']:.1f}ms, "
+                f"{summary['queries']} queries ({summary['runs']} runs)"
+            )
+        if options["save_baseline"]:
+            with open(options["save_baseline"], "w") as baseline_file:
+                json.dump(results, baseline_file, indent=2)
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline_file:
+                regressions = compare_to_baseline(results, json.load(baseline_file), options["tolerance"])
+            if regressions:
+                raise CommandError("Regressions:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regression against the baseline"))
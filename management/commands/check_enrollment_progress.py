@@ -0,0 +1,34 @@
+"""
+Compare EnrollmentProgress counters with StudentModule and optionally repair them.
+
+    ./manage.py lms check_enrollment_progress --course-id course-v1:Org+Num+Run --fix
+"""
+from django.core.management.base import BaseCommand
+from opaque_keys.edx.keys import CourseKey
+
+from custom_views.models import EnrollmentProgress
+from custom_views.progress_counters import find_inconsistent_progress
+
+
+class Command(BaseCommand):
+    help = "Report (and with --fix, repair) per-enrollment progress counters that drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--course-id", dest="course_id", help="Only check this course.")
+        parser.add_argument("--fix", action="store_true", help="Overwrite inconsistent counters.")
+
+    def handle(self, *args, **options):
+        rows = EnrollmentProgress.objects.order_by("id")
+        if options["course_id"]:
+            rows = rows.filter(course_id=CourseKey.from_string(options["course_id"]))
+        inconsistent = 0
+        for progress, expected in find_inconsistent_progress(rows):
+            inconsistent += 1
+            self.stdout.write(
+                f"user {progress.user_id} in {progress.course_id}: "
+                f"answered={progress.answered}, expected {expected}"
+            )
+            if options["fix"]:
+                EnrollmentProgress.objects.filter(id=progress.id).update(answered=expected)
+        style = self.style.WARNING if inconsistent else self.style.SUCCESS
+        self.stdout.write(style(f"{inconsistent} inconsistent enrollment(s)"))
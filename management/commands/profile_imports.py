@@ -0,0 +1,85 @@
+"""
+Report the import cost of the plugin's modules on top of a booted Django.
+
+    ./manage.py lms profile_imports
+    ./manage.py cms profile_imports --module custom_views.signals
+
+Each module is imported in a fresh interpreter (``python -X importtime``)
+after ``django.setup()``, so only the cost the module itself adds is counted:
+wall time, resident memory growth, number of newly imported modules and the
+slowest of them.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_MODULES = (
+    "custom_views.signals",
+    "custom_views.utils",
+    "custom_views.views",
+    "custom_views.urls",
+    "custom_views.overrides",
+    "custom_views.reset",
+)
+
+PROBE = """
+import json, resource, sys, time
+import django
+django.setup()
+sys.stderr.write("custom_views-probe-start\\n")
+before = set(sys.modules)
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+started = time.perf_counter()
+__import__(sys.argv[1])
+print(json.dumps({
+    "seconds": time.perf_counter() - started,
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before,
+    "new_modules": sorted(set(sys.modules) - before),
+}))
+"""
+
+
+def _slowest(importtime_output, new_modules, top):
+    """
+    Parse ``-X importtime`` lines logged after the probe marker and return
+    the ``top`` new modules by self time, in microseconds.
+    """
+    lines = importtime_output.split("custom_views-probe-start\n", 1)[-1].splitlines()
+    timings = []
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if self_us.isdigit() and name in new_modules:
+            timings.append((int(self_us), name))
+    return sorted(timings, reverse=True)[:top]
+
+
+class Command(BaseCommand):
+    help = "Measure the import time and memory each plugin module adds to a booted worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--module", action="append", help="Module to profile (repeatable).")
+        parser.add_argument("--top", type=int, default=10, help="Slowest imports to list per module.")
+
+    def handle(self, *args, **options):
+        for module in options["module"] or DEFAULT_MODULES:
+            completed = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", PROBE, module],
+                capture_output=True,
+                text=True,
+                env=os.environ.copy(),
+            )
+            if completed.returncode:
+                raise CommandError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            new_modules = set(result["new_modules"])
+            self.stdout.write(
+                f"{module}: {result['seconds'] * 1000:.0f}ms, +{result['rss_kb'] / 1024:.1f}MB RSS, "
+                f"{len(new_modules)} new modules"
+            )
+            for self_us, name in _slowest(completed.stderr, new_modules, options["top"]):
+                self.stdout.write(f"    {self_us / 1000:8.1f}ms  {name}")
@@ -0,0 +1,22 @@
+"""
+Delete StudentModule rows and submissions left behind by deferred resets.
+
+    ./manage.py lms purge_deferred_resets --limit 1000 --sleep 0.5
+"""
+from django.core.management.base import BaseCommand
+
+from custom_views.reset import purge_deferred_resets
+
+
+class Command(BaseCommand):
+    help = "Purge state from previous generations of deferred course resets."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, help="Purge at most this many enrollments.")
+        parser.add_argument(
+            "--sleep", type=float, help="Seconds to pause between enrollments (default CUSTOM_VIEWS_PURGE_SLEEP)."
+        )
+
+    def handle(self, *args, **options):
+        purged = purge_deferred_resets(limit=options["limit"], sleep=options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} enrollment(s)"))
@@ -0,0 +1,59 @@
+"""
+Replay request traces recorded with CUSTOM_VIEWS_RECORD_REQUESTS against a test server.
+
+    ./manage.py lms replay_traces /tmp/custom_views_traces.jsonl --base-url http://localhost:18000 \
+        --concurrency 16 --speedup 10 --header "Authorization: JWT ..." --default-user-id 42
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from custom_views.replay import Replayer, load_traces
+
+
+class Command(BaseCommand):
+    help = "Replay recorded plugin traffic and report throughput, latency and error rate."
+
+    def add_arguments(self, parser):
+        parser.add_argument("traces", help="JSONL trace file.")
+        parser.add_argument("--base-url", dest="base_url", required=True, help="Test server root URL.")
+        parser.add_argument("--concurrency", type=int, default=4, help="Concurrent requests.")
+        parser.add_argument(
+            "--speedup", type=float, default=1.0, help="Time compression factor; 0 replays without pauses."
+        )
+        parser.add_argument("--endpoint", action="append", help="Only replay this endpoint (repeatable).")
+        parser.add_argument(
+            "--header", action="append", default=[], help='Extra request header, "Name: value" (repeatable).'
+        )
+        parser.add_argument("--user-map", dest="user_map", help="JSON file mapping pseudonyms to user ids.")
+        parser.add_argument(
+            "--default-user-id", dest="default_user_id", type=int, help="User id for unmapped pseudonyms."
+        )
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        headers = {}
+        for header in options["header"]:
+            name, sep, value = header.partition(":")
+            if not sep:
+                raise CommandError(f"Invalid header: {header}")
+            headers[name.strip()] = value.strip()
+        user_map = {}
+        if options["user_map"]:
+            with open(options["user_map"]) as user_map_file:
+                user_map = json.load(user_map_file)
+        traces = load_traces(options["traces"], endpoints=options["endpoint"])
+        replayer = Replayer(
+            options["base_url"], headers=headers, user_map=user_map, default_user_id=options["default_user_id"]
+        )
+        summaries = replayer.replay(traces, concurrency=options["concurrency"], speedup=options["speedup"])
+        if options["json"]:
+            self.stdout.write(json.dumps(summaries, indent=2))
+            return
+        for name, summary in summaries.items():
+            self.stdout.write(
+                f"{name}: {summary['requests']} requests, {summary['throughput_rps']:.1f} req/s, "
+                f"p50 {summary['p50_ms']:.1f}ms p90 {summary['p90_ms']:.1f}ms p99 {summary['p99_ms']:.1f}ms "
+                f"max {summary['max_ms']:.1f}ms, errors {summary['error_rate']:.1%}, "
+                f"4xx {summary['client_errors']}"
+            )
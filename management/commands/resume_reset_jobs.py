@@ -0,0 +1,16 @@
+"""
+Re-queue background reset jobs whose worker died.
+
+    ./manage.py lms resume_reset_jobs
+"""
+from django.core.management.base import BaseCommand
+
+from custom_views.jobs import resume_stale_jobs
+
+
+class Command(BaseCommand):
+    help = "Resume unfinished course reset jobs that stopped reporting progress."
+
+    def handle(self, *args, **options):
+        resumed = resume_stale_jobs()
+        self.stdout.write(self.style.SUCCESS(f"Resumed {resumed} reset job(s)"))
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("custom_views", "0002_resetjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="enrollmentprogress",
+            name="generation",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="enrollmentprogress",
+            name="generation_cutoff",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="enrollmentprogress",
+            name="purge_pending",
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("custom_views", "0004_bulkresetrun"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="enrollmentprogress",
+            name="computed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
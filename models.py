@@ -0,0 +1,163 @@
+"""
+Database models for custom_views.
+"""
+import uuid
+
+from django.conf import settings
+from django.db import models
+from opaque_keys.edx.django.models import CourseKeyField
+
+
+class EnrollmentProgress(models.Model):
+    """
+    Materialized answered/reset counters for one learner in one course.
+
+    Recomputed lazily: a row is stale when ``computed_at`` is unset or an
+    answerable StudentModule row was modified after it. The reset paths and
+    score-change signals update or invalidate it explicitly.
+
+    .. no_pii:
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    course_id = CourseKeyField(max_length=255, db_index=True)
+    answered = models.PositiveIntegerField(default=0)
+    resetcount = models.PositiveIntegerField(default=0)
+    # Deferred resets: StudentModule rows modified at or before
+    # ``generation_cutoff`` belong to an older generation and are treated as
+    # absent until the purger deletes them.
+    generation = models.PositiveIntegerField(default=0)
+    generation_cutoff = models.DateTimeField(null=True, blank=True)
+    purge_pending = models.BooleanField(default=False, db_index=True)
+    computed_at = models.DateTimeField(null=True, blank=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = "custom_views"
+        unique_together = ("user", "course_id")
+
+    def __str__(self):
+        return f"{self.user_id} {self.course_id}: answered={self.answered} resetcount={self.resetcount}"
+
+
+class BulkResetRun(models.Model):
+    """
+    An administrative reset of one course for many learners.
+
+    Each learner is reset through its own ResetJob linked to the run, which
+    doubles as the run's checkpoint: resuming a run skips learners whose job
+    already succeeded.
+
+    .. no_pii:
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    FINISHED = "finished"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (FINISHED, "Finished"),
+    )
+
+    run_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    course_id = CourseKeyField(max_length=255, db_index=True)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    # What the run targets, e.g. "all", "cohort:<name>" or "users".
+    scope = models.CharField(max_length=255)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    total = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = "custom_views"
+
+    def __str__(self):
+        return f"BulkResetRun {self.run_id} ({self.status}) {self.course_id} {self.scope}"
+
+    def summary(self):
+        jobs = ResetJob.objects.filter(bulk_run=self)
+        counts = dict(jobs.values_list("status").annotate(count=models.Count("id")))
+        totals = jobs.aggregate(
+            modules=models.Sum("modules_processed"), failures=models.Sum("failures")
+        )
+        return {
+            "run_id": str(self.run_id),
+            "course_id": str(self.course_id),
+            "scope": self.scope,
+            "status": self.status,
+            "total": self.total,
+            "succeeded": counts.get(ResetJob.SUCCEEDED, 0),
+            "failed": counts.get(ResetJob.FAILED, 0),
+            "pending": self.total - counts.get(ResetJob.SUCCEEDED, 0) - counts.get(ResetJob.FAILED, 0),
+            "modules_deleted": totals["modules"] or 0,
+            "module_failures": totals["failures"] or 0,
+            "failed_user_ids": list(
+                jobs.filter(status=ResetJob.FAILED).values_list("user_id", flat=True)
+            ),
+            "elapsed_seconds": (self.modified - self.created).total_seconds(),
+        }
+
+
+class ResetJob(models.Model):
+    """
+    A course reset executed in the background.
+
+    Jobs are idempotent: running a job again after a worker crash only deletes
+    what is left and does not count the reset twice.
+
+    .. no_pii:
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    )
+    UNFINISHED_STATUSES = (PENDING, RUNNING)
+
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    course_id = CourseKeyField(max_length=255, db_index=True)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    bulk_run = models.ForeignKey(BulkResetRun, null=True, blank=True, on_delete=models.CASCADE)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    modules_total = models.PositiveIntegerField(default=0)
+    modules_processed = models.PositiveIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)
+    # Set once the enrollment's reset counter has been bumped for this job.
+    counted = models.BooleanField(default=False)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = "custom_views"
+        index_together = [("user", "course_id", "status")]
+
+    def __str__(self):
+        return f"ResetJob {self.job_id} ({self.status}) {self.user_id} {self.course_id}"
+
+    def to_dict(self):
+        return {
+            "job_id": str(self.job_id),
+            "user_id": self.user_id,
+            "course_id": str(self.course_id),
+            "status": self.status,
+            "modules_total": self.modules_total,
+            "modules_processed": self.modules_processed,
+            "failures": self.failures,
+            "attempts": self.attempts,
+            "error": self.error,
+        }
@@ -1,14 +1,11 @@
 """Overrides for Open edX functions."""
 import logging
-from datetime import datetime
 
-from common.djangoapps.edxmako.shortcuts import render_to_response
-from common.djangoapps.util.db import outer_atomic
 from django.conf import settings
 from django.contrib.auth.models import (
     User,
 )  # lint-amnesty, pylint: disable=imported-auth-user
-from django.db.models import prefetch_related_objects, F
+from django.db.models import prefetch_related_objects
 from django.http import (
     Http404,
     HttpResponse,
@@ -19,18 +16,22 @@ from django.utils.translation import ugettext as _
 
 from opaque_keys import InvalidKeyError
 from opaque_keys.edx.keys import CourseKey
-from xmodule.modulestore.django import modulestore
 
-from amat_analytics.models import EmployeeResetCount
+from custom_views.instrumentation import instrumented, phase
+from custom_views.recorder import recorded
 
 
 log = logging.getLogger("amat_extensions.overrides")
 
 
+@recorded("change_enrollment", request_arg=1)
+@instrumented("change_enrollment")
 def change_enrollment(prev_func, request, check_access=True):
     from common.djangoapps.student.models import CourseEnrollment
-    from lms.djangoapps.courseware.models import StudentModule
-    from custom_views.views import reset_student_attempts
+    from custom_views.analytics import increment_reset_count
+    from custom_views.jobs import submit_reset_job
+    from custom_views.reset import defer_course_reset, reset_course
+    from custom_views.singleflight import SingleFlightTimeout, reset_flight_key, single_flight
 
     # Get the user
     user = request.user
@@ -57,31 +58,43 @@ def change_enrollment(prev_func, request, check_access=True):
 
     if action == "reset":
         log.info("In Reset")
-        if not CourseEnrollment.is_enrolled(user, course_id):
+        enrollment_id = (
+            CourseEnrollment.objects.filter(course_id=course_id, user=user, is_active=True)
+            .values_list("id", flat=True)
+            .first()
+        )
+        if enrollment_id is None:
             return HttpResponseBadRequest(_("You are not enrolled in this course"))
 
-        enrollment = CourseEnrollment.objects.filter(course_id=course_id, user=user).first()
-        if enrollment:
-            reset_count, created = EmployeeResetCount.objects.get_or_create(course_enrollment=enrollment)
-            if created:
-                reset_count.first_reset_date = datetime.now()
-
-            reset_count.last_reset_date = datetime.now()
-            reset_count.reset_count = F('reset_count') + 1
-            reset_count.save()
-
-        for exam in StudentModule.objects.filter(student=user, course_id=course_id):
-            try:
-                reset_student_attempts(
-                    course_id, user, exam.module_state_key, None, True
-                )
-            except:
-                pass
-            exam.delete()
-        return HttpResponse("/dashboard")
+        def perform_reset():
+            if getattr(settings, "CUSTOM_VIEWS_DEFERRED_RESET", False):
+                increment_reset_count(enrollment_id)
+                defer_course_reset(course_id, user)
+                return {}
+            if getattr(settings, "CUSTOM_VIEWS_ASYNC_RESET", False):
+                job, created = submit_reset_job(course_id, user, requesting_user=user)
+                # A retry while the job is still running joins it uncounted.
+                if created:
+                    increment_reset_count(enrollment_id)
+                return {"job_id": str(job.job_id)}
+            increment_reset_count(enrollment_id)
+            return reset_course(course_id, user, requesting_user=user).to_dict()
+
+        # A double-submitted reset joins the one in flight instead of
+        # running (and being counted) twice.
+        try:
+            result, _shared = single_flight(reset_flight_key(user.id, course_id), perform_reset)
+        except SingleFlightTimeout:
+            return HttpResponse(_("A reset of this course is already in progress"), status=409)
+        response = HttpResponse("/dashboard")
+        if "job_id" in result:
+            response["X-Reset-Job-Id"] = result["job_id"]
+        return response
     return prev_func(request, check_access=check_access)
 
 
+@recorded("progress", request_arg=1, student_arg=3)
+@instrumented("progress")
 def progress(prev_func, request, course_key, student_id):
     """
     Override of the unwrapped version of "progress".
@@ -90,13 +103,14 @@ def progress(prev_func, request, course_key, student_id):
     """
     from lms.djangoapps.ccx.custom_exception import CCXLocatorValidationException
     from lms.djangoapps.courseware.access import has_access, has_ccx_coach_role
-    from lms.djangoapps.courseware.courses import get_course_with_access, get_studio_url
+    from lms.djangoapps.courseware.courses import get_studio_url
     from lms.djangoapps.courseware.masquerade import setup_masquerade
     from lms.djangoapps.courseware.permissions import (
         MASQUERADE_AS_STUDENT,
     )  # lint-amnesty, pylint: disable=unused-import
+    from common.djangoapps.edxmako.shortcuts import render_to_response
     from common.djangoapps.student.models import CourseEnrollment
-    from lms.djangoapps.grades.api import CourseGradeFactory
+    from common.djangoapps.util.db import outer_atomic
     from lms.djangoapps.courseware.views.views import (
         credit_course_requirements,
         get_cert_data,
@@ -105,6 +119,9 @@ def progress(prev_func, request, course_key, student_id):
     from openedx.features.course_duration_limits.access import (
         generate_course_expired_fragment,
     )
+    from custom_views.progress_cache import cache_progress, get_cached_progress, progress_cache_key
+    from custom_views.request_cache import get_course_with_access, read_course_grade
+    from custom_views.routers import replica_reads
     from custom_views.utils import calculate_grade_stats
 
     if student_id is not None:
@@ -114,7 +131,8 @@ def progress(prev_func, request, course_key, student_id):
         except ValueError:
             raise Http404  # lint-amnesty, pylint: disable=raise-missing-from
 
-    course = get_course_with_access(request.user, "load", course_key)
+    with phase("course"):
+        course = get_course_with_access(request.user, "load", course_key)
 
     staff_access = bool(has_access(request.user, "staff", course))
     can_masquerade = request.user.has_perm(MASQUERADE_AS_STUDENT, course)
@@ -148,15 +166,24 @@ def progress(prev_func, request, course_key, student_id):
     prefetch_related_objects([student], "groups")
     if request.user.id != student.id:
         # refetch the course as the assumed student
-        course = get_course_with_access(
-            student, "load", course_key, check_if_enrolled=True
-        )
+        with phase("course"):
+            course = get_course_with_access(
+                student, "load", course_key, check_if_enrolled=True
+            )
+
+    # Repeat views of an unchanged page skip grading and rendering.
+    with phase("cache"):
+        cache_key = progress_cache_key(request, student, course_key, masquerade)
+        cached_response = get_cached_progress(cache_key)
+    if cached_response is not None:
+        return cached_response
 
     # NOTE: To make sure impersonation by instructor works, use
     # student instead of request.user in the rest of the function.
 
-    course_grade = CourseGradeFactory().read(student, course)
-    courseware_summary = list(course_grade.chapter_grades.values())
+    with phase("grades"):
+        course_grade = read_course_grade(student, course)
+        courseware_summary = list(course_grade.chapter_grades.values())
 
     studio_url = get_studio_url(course, "settings/grading")
     # checking certificate generation configuration
@@ -203,18 +230,8 @@ def progress(prev_func, request, course_key, student_id):
         )
     )
 
-    answered = 0
-    reset = None
-    if request.user.id != student.id:
-        # refetch the course as the assumed student
-        course = get_course_with_access(
-            student, "load", course_key, check_if_enrolled=True
-        )
-
-    course_grade = CourseGradeFactory().read(student, course)
-    courseware_summary = list(course_grade.chapter_grades.values())
-
-    answered, reset, count = calculate_grade_stats(request.user.id, course.id, courseware_summary)
+    with phase("stats"), replica_reads(student.id):
+        answered, reset, count = calculate_grade_stats(student.id, course.id, courseware_summary)
     progress_context = {
         "answered": answered,
         "count": count,
@@ -224,8 +241,9 @@ def progress(prev_func, request, course_key, student_id):
 
     context.update(progress_context)
 
-    with outer_atomic():
+    with phase("render"), outer_atomic():
         response = render_to_response("courseware/progress.html", context)
+    cache_progress(cache_key, response)
 
     return response
 
@@ -0,0 +1,113 @@
+"""
+Cache of rendered progress pages.
+
+A page is cached per (viewer, student, course) under a key made of the
+learner's grade validator (course version plus last StudentModule and grade
+modifications, see ``grades_cache.grade_validator``), the masquerade state,
+and an invalidation counter bumped by score changes and resets. Language,
+host and the CSRF secret embedded in the page are part of the key too.
+
+A cached page keeps the headers the view set on it (the middleware adds its
+own on every response).
+
+``CUSTOM_VIEWS_PROGRESS_CACHE_TIMEOUT`` bounds how long a page is reused
+(for time-based parts such as the course expiration message); 0 disables the
+cache.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+from custom_views.grades_cache import grade_validator
+from custom_views.routers import replica_reads
+
+DEFAULT_PROGRESS_CACHE_TIMEOUT = 5 * 60
+PROGRESS_PAGE_KEY = "custom_views.progress_page.v2.{digest}"
+PROGRESS_VERSION_KEY = "custom_views.progress_page_version.{user_id}.{course_key}"
+
+
+def _cache_timeout():
+    return getattr(settings, "CUSTOM_VIEWS_PROGRESS_CACHE_TIMEOUT", DEFAULT_PROGRESS_CACHE_TIMEOUT)
+
+
+def _progress_version(user_id, course_key):
+    return cache.get(PROGRESS_VERSION_KEY.format(user_id=user_id, course_key=course_key), 1)
+
+
+def _bump_progress_version(user_id, course_key):
+    key = PROGRESS_VERSION_KEY.format(user_id=user_id, course_key=course_key)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def invalidate_progress(user_id, course_key):
+    """
+    Drop the cached progress pages of ``user_id`` in ``course_key`` once the
+    current transaction commits; before that, a concurrent request could
+    still render the old state and cache it under the new version.
+    """
+    transaction.on_commit(lambda: _bump_progress_version(user_id, course_key))
+
+
+def _masquerade_state(masquerade):
+    if masquerade is None:
+        return None
+    return (
+        masquerade.role,
+        masquerade.user_name,
+        getattr(masquerade, "user_partition_id", None),
+        getattr(masquerade, "group_id", None),
+    )
+
+
+def progress_cache_key(request, student, course_key, masquerade):
+    """
+    Return the cache key of the progress page ``request`` would render, or
+    None when the page must not be cached.
+    """
+    if not _cache_timeout():
+        return None
+    with replica_reads(student.id):
+        etag, _ = grade_validator(student.id, course_key)
+    parts = (
+        request.user.id,
+        student.id,
+        str(course_key),
+        etag,
+        _masquerade_state(masquerade),
+        _progress_version(student.id, course_key),
+        getattr(request, "LANGUAGE_CODE", None),
+        request.get_host(),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+    )
+    return PROGRESS_PAGE_KEY.format(digest=hashlib.sha256(repr(parts).encode("utf-8")).hexdigest())
+
+
+def get_cached_progress(cache_key):
+    if cache_key is None:
+        return None
+    cached = cache.get(cache_key)
+    if cached is None:
+        return None
+    response = HttpResponse(cached["content"])
+    for header, value in cached["headers"]:
+        response[header] = value
+    return response
+
+
+def cache_progress(cache_key, response):
+    if cache_key is None or response.status_code != 200:
+        return
+    cache.set(
+        cache_key,
+        {
+            "content": response.content,
+            "headers": [(header, value) for header, value in response.items() if header != "Content-Length"],
+        },
+        _cache_timeout(),
+    )
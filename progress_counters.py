@@ -0,0 +1,189 @@
+"""
+Lazily maintained per-enrollment progress counters.
+
+``EnrollmentProgress`` rows hold the "answered" and "reset" numbers shown on
+the progress page. A row is recomputed from StudentModule on read when it is
+missing or stale; the reset engine updates it directly and score-change
+signals mark it stale. No StudentModule model signal is used, so bulk
+deletes of StudentModule keep Django's fast delete path.
+"""
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from custom_views.models import EnrollmentProgress
+from custom_views.routers import primary_reads
+
+log = logging.getLogger(__name__)
+
+
+def recompute_progress(user_id, course_id):
+    """
+    Rebuild the counters for one enrollment from StudentModule.
+    """
+    from custom_views.utils import answered_count
+
+    # Counted on the primary: a lagging replica would store counts older
+    # than computed_at that never look stale.
+    with primary_reads():
+        # Taken before counting, so rows saved while counting mark it stale again.
+        computed_at = timezone.now()
+        cutoff = (
+            EnrollmentProgress.objects.filter(user_id=user_id, course_id=course_id)
+            .values_list("generation_cutoff", flat=True)
+            .first()
+        )
+        answered, reset = answered_count(user_id, course_id, modified_after=cutoff)
+        progress, created = EnrollmentProgress.objects.get_or_create(
+            user_id=user_id,
+            course_id=course_id,
+            defaults={"answered": answered, "resetcount": reset or 0, "computed_at": computed_at},
+        )
+        if not created:
+            progress.answered = answered
+            progress.resetcount = max(progress.resetcount, reset or 0)
+            progress.computed_at = computed_at
+            progress.save(update_fields=["answered", "resetcount", "computed_at", "modified"])
+    return progress
+
+
+def is_stale(progress):
+    """
+    True when an answerable StudentModule row changed after the counters
+    were computed.
+    """
+    from lms.djangoapps.courseware.models import StudentModule
+
+    from custom_views.utils import ANSWERABLE_MODULE_TYPES
+
+    if progress.computed_at is None:
+        return True
+    return StudentModule.objects.filter(
+        student_id=progress.user_id,
+        course_id=progress.course_id,
+        module_type__in=ANSWERABLE_MODULE_TYPES,
+        modified__gt=progress.computed_at,
+    ).exists()
+
+
+def get_progress_counts(user_id, course_id):
+    """
+    Return ``(answered, reset)`` for an enrollment, as ``answered_count`` does.
+    """
+    progress = EnrollmentProgress.objects.filter(user_id=user_id, course_id=course_id).first()
+    if progress is None or is_stale(progress):
+        progress = recompute_progress(user_id, course_id)
+    return progress.answered, progress.resetcount or False
+
+
+def get_progress_counts_in_bulk(user_ids, course_id):
+    """
+    Return ``{user_id: (answered, reset)}`` for many enrollments of one
+    course. Counters are read and checked for staleness with two queries;
+    only missing or stale ones are recomputed.
+    """
+    from lms.djangoapps.courseware.models import StudentModule
+
+    from custom_views.utils import ANSWERABLE_MODULE_TYPES
+
+    rows = {
+        progress.user_id: progress
+        for progress in EnrollmentProgress.objects.filter(user_id__in=user_ids, course_id=course_id)
+    }
+    last_modified = dict(
+        StudentModule.objects.filter(
+            student_id__in=list(rows), course_id=course_id, module_type__in=ANSWERABLE_MODULE_TYPES
+        )
+        .order_by()
+        .values("student_id")
+        .annotate(last_modified=Max("modified"))
+        .values_list("student_id", "last_modified")
+    )
+    counts = {}
+    for user_id in user_ids:
+        progress = rows.get(user_id)
+        if (
+            progress is None
+            or progress.computed_at is None
+            or last_modified.get(user_id, progress.computed_at) > progress.computed_at
+        ):
+            progress = recompute_progress(user_id, course_id)
+        counts[user_id] = (progress.answered, progress.resetcount or False)
+    return counts
+
+
+def mark_progress_stale(user_id, course_id):
+    """
+    Have the next read recompute the counters, e.g. after a StudentModule
+    row was deleted outside the reset engine.
+    """
+    EnrollmentProgress.objects.filter(user_id=user_id, course_id=course_id).update(computed_at=None)
+
+
+def record_reset(user_id, course_id):
+    """
+    Clear the answered counter and bump the reset counter after a course reset.
+    """
+    values = {"answered": 0, "resetcount": F("resetcount") + 1, "computed_at": timezone.now()}
+    updated = EnrollmentProgress.objects.filter(user_id=user_id, course_id=course_id).update(**values)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            EnrollmentProgress.objects.create(
+                user_id=user_id, course_id=course_id, answered=0, resetcount=1, computed_at=values["computed_at"]
+            )
+    except IntegrityError:
+        # Created concurrently; apply the increment to that row instead.
+        EnrollmentProgress.objects.filter(user_id=user_id, course_id=course_id).update(**values)
+
+
+def start_new_generation(user_id, course_id):
+    """
+    Start a new state generation for an enrollment: StudentModule rows last
+    modified before now belong to the previous generation and are ignored by
+    this plugin's reads until they are purged. Runs a single statement in
+    the common case, whatever the size of the course.
+    """
+    cutoff = timezone.now()
+    values = {
+        "answered": 0,
+        "resetcount": F("resetcount") + 1,
+        "generation": F("generation") + 1,
+        "generation_cutoff": cutoff,
+        "purge_pending": True,
+        "computed_at": cutoff,
+    }
+    updated = EnrollmentProgress.objects.filter(user_id=user_id, course_id=course_id).update(**values)
+    if not updated:
+        try:
+            with transaction.atomic():
+                EnrollmentProgress.objects.create(
+                    user_id=user_id,
+                    course_id=course_id,
+                    resetcount=1,
+                    generation=1,
+                    generation_cutoff=cutoff,
+                    purge_pending=True,
+                    computed_at=cutoff,
+                )
+        except IntegrityError:
+            EnrollmentProgress.objects.filter(user_id=user_id, course_id=course_id).update(**values)
+    return cutoff
+
+
+def find_inconsistent_progress(queryset):
+    """
+    Yield ``(progress, expected_answered)`` for rows whose answered counter
+    no longer matches StudentModule.
+    """
+    from custom_views.utils import answered_count
+
+    for progress in queryset.iterator():
+        expected, _ = answered_count(
+            progress.user_id, progress.course_id, modified_after=progress.generation_cutoff
+        )
+        if expected != progress.answered:
+            yield progress, expected
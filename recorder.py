@@ -0,0 +1,127 @@
+"""
+Sampled recording of production traffic to the plugin's endpoints.
+
+With ``CUSTOM_VIEWS_RECORD_REQUESTS`` a ``CUSTOM_VIEWS_RECORD_SAMPLE_RATE``
+fraction of the requests to recorded endpoints is appended as one JSON line
+to ``CUSTOM_VIEWS_RECORD_PATH``. Traces are scrubbed: only known parameters
+are kept, and user ids are replaced by keyed pseudonyms that stay stable
+within the traces (so one learner's polls and resets still line up) but
+cannot be mapped back without ``SECRET_KEY``.
+
+Traces are replayed against a test server by the ``replay_traces``
+management command.
+"""
+import functools
+import hashlib
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_RATE = 0.01
+DEFAULT_RECORD_PATH = "/tmp/custom_views_traces.jsonl"
+
+# Parameters kept as-is; everything else is dropped.
+KEPT_PARAMS = ("course_id", "enrollment_action", "detail", "async")
+# Parameters holding a user id, replaced by a pseudonym.
+USER_ID_PARAMS = ("user_id", "student_id")
+STUDENT_PLACEHOLDER = "{student_id}"
+
+_write_lock = threading.Lock()
+
+
+def pseudonymize(user_id):
+    if user_id in (None, ""):
+        return None
+    digest = hmac.new(
+        settings.SECRET_KEY.encode("utf-8"), str(user_id).encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+    return "u_" + digest[:16]
+
+
+def _scrub_params(params):
+    scrubbed = {}
+    for name in KEPT_PARAMS:
+        if name in params:
+            scrubbed[name] = params.get(name)
+    for name in USER_ID_PARAMS:
+        if name in params:
+            scrubbed[name] = pseudonymize(params.get(name))
+    return scrubbed
+
+
+def _should_record():
+    if not getattr(settings, "CUSTOM_VIEWS_RECORD_REQUESTS", False):
+        return False
+    return random.random() < getattr(settings, "CUSTOM_VIEWS_RECORD_SAMPLE_RATE", DEFAULT_SAMPLE_RATE)
+
+
+def build_trace(endpoint, request, response, started, duration, student_id=None):
+    """
+    Return the scrubbed trace of one request.
+    """
+    path = request.path
+    if student_id is not None:
+        path = "/".join(
+            STUDENT_PLACEHOLDER if segment == str(student_id) else segment for segment in path.split("/")
+        )
+    user = getattr(request, "user", None)
+    return {
+        "ts": round(started, 3),
+        "endpoint": endpoint,
+        "method": request.method,
+        "path": path,
+        "query": _scrub_params(request.GET),
+        "form": _scrub_params(request.POST) if request.method == "POST" else {},
+        "user": pseudonymize(user.id) if user is not None and user.is_authenticated else None,
+        "student": pseudonymize(student_id),
+        # A view that raised is recorded as a server error.
+        "status": getattr(response, "status_code", 500),
+        "duration_ms": round(duration * 1000, 1),
+    }
+
+
+def write_trace(trace):
+    path = getattr(settings, "CUSTOM_VIEWS_RECORD_PATH", DEFAULT_RECORD_PATH)
+    line = json.dumps(trace, separators=(",", ":")) + "\n"
+    try:
+        with _write_lock, open(path, "a") as trace_file:
+            trace_file.write(line)
+    except OSError:
+        log.warning("Could not write request trace to %s", path)
+
+
+def recorded(endpoint, request_arg=0, student_arg=None):
+    """
+    Decorate a view to record sampled requests. For view overrides the
+    request comes after ``prev_func`` (``request_arg=1``); ``student_arg`` is
+    the position of a learner id argument that is part of the URL.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _should_record():
+                return func(*args, **kwargs)
+            started = time.time()
+            response = None
+            try:
+                response = func(*args, **kwargs)
+                return response
+            finally:
+                student_id = args[student_arg] if student_arg is not None and len(args) > student_arg else None
+                try:
+                    write_trace(
+                        build_trace(
+                            endpoint, args[request_arg], response, started, time.time() - started, student_id
+                        )
+                    )
+                except Exception:  # pylint: disable=broad-except
+                    log.exception("Failed to record a request to %s", endpoint)
+        return wrapper
+    return decorator
@@ -0,0 +1,136 @@
+"""
+Replay of recorded request traces (see ``recorder``) against a test server.
+
+Requests are sent at their recorded relative times divided by ``speedup``
+(0 sends them as fast as the workers allow), by ``concurrency`` workers.
+Pseudonymous learner ids are mapped to test-server user ids through
+``user_map``, falling back to ``default_user_id``; the replaying client
+authenticates with the given extra headers.
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from custom_views.benchmark import percentile
+from custom_views.recorder import STUDENT_PLACEHOLDER, USER_ID_PARAMS
+
+
+def load_traces(path, endpoints=None):
+    traces = []
+    with open(path) as trace_file:
+        for line in trace_file:
+            line = line.strip()
+            if not line:
+                continue
+            trace = json.loads(line)
+            if endpoints and trace["endpoint"] not in endpoints:
+                continue
+            traces.append(trace)
+    traces.sort(key=lambda trace: trace["ts"])
+    return traces
+
+
+class Replayer:
+    """
+    Send traces to ``base_url`` and collect latencies and status codes.
+    """
+
+    def __init__(self, base_url, headers=None, user_map=None, default_user_id=None, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.headers = headers or {}
+        self.user_map = user_map or {}
+        self.default_user_id = default_user_id
+        self.timeout = timeout
+        self.results = []
+        self._lock = threading.Lock()
+
+    def _user_id(self, pseudonym):
+        return self.user_map.get(pseudonym, self.default_user_id)
+
+    def _params(self, params):
+        params = dict(params)
+        for name in USER_ID_PARAMS:
+            if name in params:
+                params[name] = self._user_id(params[name])
+        return {name: value for name, value in params.items() if value is not None}
+
+    def build_request(self, trace):
+        path = trace["path"]
+        if STUDENT_PLACEHOLDER in path:
+            path = path.replace(STUDENT_PLACEHOLDER, str(self._user_id(trace["student"])))
+        url = self.base_url + path
+        query = self._params(trace["query"])
+        if query:
+            url += "?" + urlencode(query)
+        data = None
+        if trace["method"] == "POST":
+            data = urlencode(self._params(trace["form"])).encode("utf-8")
+        return Request(url, data=data, headers=self.headers, method=trace["method"])
+
+    def send(self, trace):
+        started = time.perf_counter()
+        try:
+            with urlopen(self.build_request(trace), timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except HTTPError as exc:
+            status = exc.code
+        except (URLError, OSError):
+            status = None
+        with self._lock:
+            self.results.append((trace["endpoint"], status, time.perf_counter() - started))
+
+    def replay(self, traces, concurrency=4, speedup=1.0):
+        """
+        Replay ``traces`` and return the report, see ``report``.
+        """
+        if not traces:
+            return report([], 0)
+        first_ts = traces[0]["ts"]
+        started = time.perf_counter()
+
+        def send_when_due(trace):
+            if speedup:
+                delay = (trace["ts"] - first_ts) / speedup - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            self.send(trace)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(send_when_due, traces))
+        return report(self.results, time.perf_counter() - started)
+
+
+def _summary(results, elapsed):
+    latencies = [latency for _, _, latency in results]
+    errors = sum(1 for _, status, _ in results if status is None or status >= 500)
+    return {
+        "requests": len(results),
+        "throughput_rps": len(results) / elapsed if elapsed else 0.0,
+        "error_rate": errors / len(results),
+        "client_errors": sum(1 for _, status, _ in results if status is not None and 400 <= status < 500),
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p90_ms": percentile(latencies, 0.9) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+def report(results, elapsed):
+    """
+    Return ``{"all": summary, endpoint: summary, ...}``. Server errors and
+    failed connections count as errors; 4xx responses are reported apart.
+    """
+    if not results:
+        return {}
+    by_endpoint = {}
+    for result in results:
+        by_endpoint.setdefault(result[0], []).append(result)
+    summaries = {"all": _summary(results, elapsed)}
+    for endpoint, endpoint_results in sorted(by_endpoint.items()):
+        summaries[endpoint] = _summary(endpoint_results, elapsed)
+    return summaries
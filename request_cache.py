@@ -0,0 +1,82 @@
+"""
+Request-scoped memoization of course descriptors and course grades.
+
+The progress override and ``utils.get_grades`` both need the same course and
+grade for a (student, course) pair; these helpers make sure each is computed
+at most once per request.
+"""
+from edx_django_utils.cache import RequestCache
+
+from custom_views.routers import primary_reads
+
+COURSE_CACHE_NAMESPACE = "custom_views.courses"
+GRADE_CACHE_NAMESPACE = "custom_views.course_grades"
+
+
+def get_course_by_id(course_key):
+    from lms.djangoapps.courseware import courses
+
+    request_cache = RequestCache(COURSE_CACHE_NAMESPACE)
+    cache_key = ("by_id", str(course_key))
+    cached = request_cache.get_cached_response(cache_key)
+    if cached.is_found:
+        return cached.value
+    course = courses.get_course_by_id(course_key)
+    request_cache.set(cache_key, course)
+    return course
+
+
+def get_course_with_access(user, action, course_key, **kwargs):
+    """
+    Memoized ``courseware.courses.get_course_with_access``.
+
+    Access errors are not cached, so a denied lookup raises every time.
+    """
+    from lms.djangoapps.courseware.courses import get_course_with_access as _get_course_with_access
+
+    request_cache = RequestCache(COURSE_CACHE_NAMESPACE)
+    cache_key = ("with_access", user.id, action, str(course_key), tuple(sorted(kwargs.items())))
+    cached = request_cache.get_cached_response(cache_key)
+    if cached.is_found:
+        return cached.value
+    course = _get_course_with_access(user, action, course_key, **kwargs)
+    request_cache.set(cache_key, course)
+    return course
+
+
+def zero_course_grade(student, course):
+    from lms.djangoapps.grades.course_data import CourseData
+    from lms.djangoapps.grades.course_grade import ZeroCourseGrade
+
+    return ZeroCourseGrade(student, CourseData(student, course=course))
+
+
+def read_course_grade(student, course):
+    """
+    Memoized ``CourseGradeFactory().read(student, course)``.
+
+    While a deferred reset waits for its purge the persisted grade still
+    holds the previous generation's scores, so a zero grade is returned.
+    Reading a grade may compute and save it, so the factory reads from the
+    primary even inside ``replica_reads``.
+    """
+    from lms.djangoapps.grades.api import CourseGradeFactory
+
+    from custom_views.models import EnrollmentProgress
+
+    request_cache = RequestCache(GRADE_CACHE_NAMESPACE)
+    cache_key = (student.id, str(course.id))
+    cached = request_cache.get_cached_response(cache_key)
+    if cached.is_found:
+        return cached.value
+    if EnrollmentProgress.objects.filter(user_id=student.id, course_id=course.id, purge_pending=True).exists():
+        course_grade = zero_course_grade(student, course)
+    else:
+        with primary_reads():
+            course_grade = CourseGradeFactory().read(student, course)
+    request_cache.set(cache_key, course_grade)
+    return course_grade
+
+
+def clear_course_grade(student_id, course_key):
+    RequestCache(GRADE_CACHE_NAMESPACE).delete((student_id, str(course_key)))
@@ -0,0 +1,543 @@
+"""
+Course-level reset engine.
+
+Instead of resetting one ``StudentModule`` at a time, the whole reset for a
+(student, course) pair is planned up front from the course block index and
+then executed in chunked bulk operations. Only blocks that define
+``clear_student_state`` are handled one by one, because they own their
+submission data.
+
+LMS modules (courseware, grades, submissions, modulestore) are imported by
+the functions using them.
+"""
+import logging
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+import pytz
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from custom_views.block_index import get_block_index, record_for_block
+from custom_views.events import BufferedEventEmitter
+from custom_views.instrumentation import incr, instrument, phase
+from custom_views.models import EnrollmentProgress
+from custom_views.progress_cache import invalidate_progress
+from custom_views.progress_counters import record_reset, start_new_generation
+from custom_views.routers import mark_primary_sticky
+
+log = logging.getLogger(__name__)
+
+DEFAULT_RESET_CHUNK_SIZE = 500
+STATE_DELETED_EVENT = "edx.grades.problem.state_deleted"
+DELETE_FIELDS = ("id", "student", "course_id", "module_state_key", "module_type", "modified")
+
+
+def get_reset_chunk_size():
+    return getattr(settings, "CUSTOM_VIEWS_RESET_CHUNK_SIZE", DEFAULT_RESET_CHUNK_SIZE)
+
+
+class ResetContext:
+    """
+    Per-reset values that are expensive to resolve: the requesting user and
+    the anonymous ids of both users. Resolved once and shared by every block
+    touched by the reset.
+    """
+
+    def __init__(self, course_key, student, requesting_user=None):
+        self.course_key = course_key
+        self.student = student
+        self._requesting_user = requesting_user
+        self._student_anonymous_id = None
+        self._requesting_user_anonymous_id = None
+
+    @property
+    def requesting_user(self):
+        if self._requesting_user is None:
+            # Legacy callers did not say who asked for the reset; without a
+            # "staff" user the reset is attributed to the learner.
+            self._requesting_user = User.objects.filter(username="staff").first() or self.student
+        return self._requesting_user
+
+    @property
+    def student_anonymous_id(self):
+        from common.djangoapps.student.models import anonymous_id_for_user
+
+        if self._student_anonymous_id is None:
+            self._student_anonymous_id = anonymous_id_for_user(self.student, self.course_key)
+        return self._student_anonymous_id
+
+    @property
+    def requesting_user_anonymous_id(self):
+        from common.djangoapps.student.models import anonymous_id_for_user
+
+        if self._requesting_user_anonymous_id is None:
+            self._requesting_user_anonymous_id = anonymous_id_for_user(
+                self.requesting_user, self.course_key
+            )
+        return self._requesting_user_anonymous_id
+
+
+class ResetChunk:
+    """
+    The part of a reset covering one chunk of StudentModule rows.
+    """
+
+    def __init__(self):
+        # StudentModule primary keys to delete, in bulk.
+        self.module_ids = []
+        # Usage keys of the StudentModule rows being deleted.
+        self.usage_keys = []
+        # Usage keys of blocks owning their own submission data (e.g. openassessment).
+        self.custom_clear_blocks = []
+        # Usage keys whose submissions score must be reset through the submissions API.
+        self.submission_keys = []
+        # (usage_key, max_score, weight) for scored blocks that need a zeroed score.
+        self.scored_blocks = []
+        # Subsection of each of ``submission_keys``, for the coalesced regrade.
+        self.submission_subsections = {}
+
+
+class ResetPlan:
+    """
+    Everything a course reset has to touch, resolved chunk by chunk.
+
+    Only keys are read from StudentModule, one chunk of rows at a time with
+    keyset pagination, so memory does not grow with the number of rows.
+    """
+
+    def __init__(self, course_key, student, modified_before=None):
+        self.course_key = course_key
+        self.student = student
+        self.modified_before = modified_before
+        # Subsections containing any planned scored block, filled while iterating.
+        self.subsections = set()
+        self._count = None
+
+    def _rows(self):
+        from lms.djangoapps.courseware.models import StudentModule
+
+        rows = StudentModule.objects.filter(student_id=self.student.id, course_id=self.course_key)
+        if self.modified_before is not None:
+            rows = rows.filter(modified__lte=self.modified_before)
+        return rows
+
+    def __len__(self):
+        if self._count is None:
+            self._count = self._rows().count()
+        return self._count
+
+    def chunks(self, chunk_size=None):
+        """
+        Yield a ResetChunk per ``chunk_size`` StudentModule rows.
+        """
+        chunk_size = chunk_size or get_reset_chunk_size()
+        index = get_block_index(self.course_key)
+        seen = set()
+        last_id = 0
+        while True:
+            rows = list(
+                self._rows()
+                .filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", "module_state_key")[:chunk_size]
+            )
+            if not rows:
+                return
+            chunk = ResetChunk()
+            stateful = self._stateful_keys(index, rows)
+            for module_id, usage_key in rows:
+                chunk.module_ids.append(module_id)
+                chunk.usage_keys.append(usage_key)
+                _plan_block(self, chunk, index, usage_key, seen, stateful)
+            last_id = rows[-1][0]
+            yield chunk
+
+    def _stateful_keys(self, index, rows):
+        """
+        Return the usage keys, among ``rows`` and their descendants, that
+        have a StudentModule row for the student.
+        """
+        keys = {usage_key for _, usage_key in rows}
+        descendants = set()
+        stack = list(keys)
+        while stack:
+            record = index.get(stack.pop())
+            if record is None:
+                continue
+            for child in record.children:
+                if child not in keys and child not in descendants:
+                    descendants.add(child)
+                    stack.append(child)
+        if descendants:
+            keys.update(
+                self._rows().filter(module_state_key__in=descendants).values_list("module_state_key", flat=True)
+            )
+        return keys
+
+
+class ResetResult:
+    """
+    Outcome of an executed course reset.
+    """
+
+    def __init__(self):
+        self.modules_deleted = 0
+        self.submissions_reset = 0
+        self.blocks_cleared = 0
+        self.failures = []
+
+    def to_dict(self):
+        return {
+            "modules_deleted": self.modules_deleted,
+            "submissions_reset": self.submissions_reset,
+            "blocks_cleared": self.blocks_cleared,
+            "failures": len(self.failures),
+        }
+
+
+def plan_course_reset(course_key, student, modified_before=None):
+    """
+    Build a ResetPlan for ``student`` in ``course_key``.
+
+    Block metadata comes from the cached course block index; the modulestore
+    is only consulted for blocks missing from the published tree. With
+    ``modified_before`` only rows last modified at or before it are planned.
+    """
+    return ResetPlan(course_key, student, modified_before=modified_before)
+
+
+def _lookup_record(index, usage_key):
+    record = index.get(usage_key)
+    if record is not None:
+        return record
+    from xmodule.modulestore.django import modulestore
+    from xmodule.modulestore.exceptions import ItemNotFoundError
+
+    # Orphaned or unpublished blocks are not part of the index.
+    try:
+        return record_for_block(modulestore().get_item(usage_key))
+    except ItemNotFoundError:
+        return None
+
+
+def _plan_block(plan, chunk, index, usage_key, seen, stateful):
+    """
+    Classify ``usage_key`` and its descendants, mirroring the recursion that
+    ``reset_student_attempts`` used to do per module.
+
+    As there, descendants without a StudentModule row (not in ``stateful``)
+    still get their submissions cleared, but no zeroed score. When purging a
+    deferred reset (``plan.modified_before``) only descendants with a row
+    from before the cutoff are touched: anything else belongs to the new
+    generation.
+    """
+    if usage_key in seen:
+        return
+    seen.add(usage_key)
+    record = _lookup_record(index, usage_key)
+    if record is None:
+        log.warning(
+            "Could not find %s in modulestore when attempting to reset attempts.",
+            usage_key,
+        )
+        chunk.submission_keys.append(usage_key)
+        return
+
+    for child in record.children:
+        if plan.modified_before is not None and child not in stateful:
+            continue
+        _plan_block(plan, chunk, index, child, seen, stateful)
+
+    if record.has_clear_student_state:
+        chunk.custom_clear_blocks.append(usage_key)
+        return
+    chunk.submission_keys.append(usage_key)
+    chunk.submission_subsections[usage_key] = index.subsection_for(usage_key)
+    if usage_key in stateful and record.has_score and record.max_score is not None:
+        chunk.scored_blocks.append((usage_key, record.max_score, record.weight))
+        subsection = index.subsection_for(usage_key)
+        if subsection is not None:
+            plan.subsections.add(subsection)
+
+
+def execute_course_reset(
+    plan, requesting_user=None, on_progress=None, record=True, coalesce_grades=None, full_regrade=False
+):
+    """
+    Delete all state described by ``plan`` and notify grades/tracking.
+
+    ``on_progress`` is called with the running ResetResult after each deleted
+    chunk. ``record=False`` skips bumping the enrollment's reset counter, for
+    callers resuming a reset that was already counted.
+
+    By default (``CUSTOM_VIEWS_COALESCE_RESET_GRADES``) no per-block score
+    signals are sent; the affected subsection grades and the course grade are
+    recomputed once at the end instead.
+    """
+    result = ResetResult()
+    course_key = plan.course_key
+    student = plan.student
+    context = ResetContext(course_key, student, requesting_user)
+    if coalesce_grades is None:
+        coalesce_grades = getattr(settings, "CUSTOM_VIEWS_COALESCE_RESET_GRADES", True)
+
+    # One event transaction for the whole reset; events for each chunk are
+    # emitted once its delete commits.
+    emitter = BufferedEventEmitter(STATE_DELETED_EVENT)
+    chunks = plan.chunks()
+    while True:
+        # Rows are planned lazily, one chunk at a time.
+        with phase("plan"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        _execute_chunk(plan, chunk, context, emitter, result, coalesce_grades)
+        if not coalesce_grades:
+            with phase("grade_signals"):
+                _send_score_deleted_signals(plan, chunk)
+        if on_progress is not None:
+            on_progress(result)
+
+    if record:
+        with phase("record"):
+            record_reset(student.id, course_key)
+    mark_primary_sticky(student.id)
+    invalidate_progress(student.id, course_key)
+
+    if coalesce_grades:
+        with phase("grades"):
+            update_grades_after_reset(student, course_key, plan.subsections, full=full_regrade)
+
+    log.info(
+        "Reset course %s for user %s: %s",
+        course_key,
+        student.id,
+        result.to_dict(),
+    )
+    return result
+
+
+def _execute_chunk(plan, chunk, context, emitter, result, coalesce_grades):
+    if plan.modified_before is None:
+        _reset_chunk(plan, chunk, context, emitter, result, coalesce_grades)
+        return
+    # Purging a deferred reset: the learner's saves to the chunk's rows wait
+    # until it is done, and blocks saved since the cutoff are left alone.
+    with transaction.atomic():
+        _drop_rows_saved_since_cutoff(plan, chunk)
+        _reset_chunk(plan, chunk, context, emitter, result, coalesce_grades)
+
+
+def _drop_rows_saved_since_cutoff(plan, chunk):
+    """
+    Lock the chunk's StudentModule rows still from before the cutoff and
+    remove every other block from ``chunk``.
+    """
+    from lms.djangoapps.courseware.models import StudentModule
+
+    planned = set(chunk.usage_keys) | set(chunk.custom_clear_blocks) | set(chunk.submission_keys)
+    rows = list(
+        StudentModule.objects.select_for_update()
+        .filter(
+            student_id=plan.student.id,
+            course_id=plan.course_key,
+            module_state_key__in=planned,
+            modified__lte=plan.modified_before,
+        )
+        .values_list("id", "module_state_key")
+    )
+    old_ids = {module_id for module_id, _ in rows}
+    old_keys = {usage_key for _, usage_key in rows}
+    kept = [
+        (module_id, usage_key)
+        for module_id, usage_key in zip(chunk.module_ids, chunk.usage_keys)
+        if module_id in old_ids
+    ]
+    chunk.module_ids = [module_id for module_id, _ in kept]
+    chunk.usage_keys = [usage_key for _, usage_key in kept]
+    chunk.custom_clear_blocks = [key for key in chunk.custom_clear_blocks if key in old_keys]
+    chunk.submission_keys = [key for key in chunk.submission_keys if key in old_keys]
+    chunk.scored_blocks = [block for block in chunk.scored_blocks if block[0] in old_keys]
+
+
+def _reset_chunk(plan, chunk, context, emitter, result, coalesce_grades):
+    from lms.djangoapps.courseware.models import StudentModule
+    from lms.djangoapps.grades.signals.handlers import disconnect_submissions_signal_receiver
+    from submissions import api as sub_api
+    from submissions.models import StudentItem, score_reset, score_set
+    from xmodule.modulestore.django import modulestore
+
+    course_key = plan.course_key
+    user_id = context.student_anonymous_id
+
+    if chunk.custom_clear_blocks:
+        store = modulestore()
+        with phase("clear_state"), store.bulk_operations(course_key), \
+                disconnect_submissions_signal_receiver(score_set):
+            for usage_key in chunk.custom_clear_blocks:
+                try:
+                    store.get_item(usage_key).clear_student_state(
+                        user_id=user_id,
+                        course_id=str(course_key),
+                        item_id=str(usage_key),
+                        requesting_user_id=context.requesting_user_anonymous_id,
+                    )
+                    result.blocks_cleared += 1
+                except Exception:  # pylint: disable=broad-except
+                    log.exception("Failed to clear student state for %s", usage_key)
+                    result.failures.append(usage_key)
+
+    if chunk.submission_keys:
+        submission_keys = {str(usage_key): usage_key for usage_key in chunk.submission_keys}
+        # Coalesced: the reset scores are regraded once with the rest.
+        signals = disconnect_submissions_signal_receiver(score_reset) if coalesce_grades else nullcontext()
+        with phase("submissions"), signals:
+            # Only items that ever had a submission need a reset score.
+            item_ids = StudentItem.objects.filter(
+                student_id=user_id,
+                course_id=str(course_key),
+                item_id__in=list(submission_keys),
+            ).values_list("item_id", flat=True)
+            for item_id in item_ids:
+                try:
+                    sub_api.reset_score(user_id, str(course_key), item_id)
+                    result.submissions_reset += 1
+                except Exception:  # pylint: disable=broad-except
+                    log.exception("Failed to reset submission score for %s", item_id)
+                    result.failures.append(item_id)
+                    continue
+                subsection = chunk.submission_subsections.get(submission_keys[item_id])
+                if subsection is not None:
+                    plan.subsections.add(subsection)
+
+    event_data = {
+        "user_id": str(plan.student.id),
+        "course_id": str(course_key),
+        "instructor_id": str(context.requesting_user.id),
+    }
+    with phase("delete"), transaction.atomic():
+        # Any cascade or signal makes Django load the rows before deleting
+        # them; keep the large ``state`` column out of them if it does.
+        StudentModule.objects.filter(id__in=chunk.module_ids).only(*DELETE_FIELDS).delete()
+        for usage_key in chunk.usage_keys:
+            emitter.add(dict(event_data, problem_id=str(usage_key)))
+        emitter.flush_on_commit()
+    result.modules_deleted += len(chunk.module_ids)
+    incr("modules", len(chunk.module_ids))
+
+
+def _send_score_deleted_signals(plan, chunk):
+    """
+    Send one PROBLEM_RAW_SCORE_CHANGED per scored block, each of which
+    triggers its own persistent grade recalculation downstream.
+    """
+    from lms.djangoapps.grades.constants import ScoreDatabaseTableEnum
+    from lms.djangoapps.grades.signals.signals import PROBLEM_RAW_SCORE_CHANGED
+
+    modified = datetime.now().replace(tzinfo=pytz.UTC)
+    for usage_key, max_score, weight in chunk.scored_blocks:
+        PROBLEM_RAW_SCORE_CHANGED.send(
+            sender=None,
+            raw_earned=0,
+            raw_possible=max_score,
+            weight=weight,
+            user_id=plan.student.id,
+            course_id=str(plan.course_key),
+            usage_id=str(usage_key),
+            score_deleted=True,
+            only_if_higher=False,
+            modified=modified,
+            score_db_table=ScoreDatabaseTableEnum.courseware_student_module,
+        )
+
+
+def update_grades_after_reset(student, course_key, subsection_keys, full=False):
+    """
+    Recompute persisted grades once for the whole reset: each affected
+    subsection grade, then the course grade. With ``full`` every subsection
+    is recomputed, e.g. when resuming a reset whose affected subsections
+    were not recorded.
+    """
+    from lms.djangoapps.course_blocks.api import get_course_blocks
+    from lms.djangoapps.grades.api import CourseGradeFactory
+    from lms.djangoapps.grades.subsection_grade_factory import SubsectionGradeFactory
+    from xmodule.modulestore.django import modulestore
+
+    if full:
+        CourseGradeFactory().update(student, course_key=course_key, force_update_subsections=True)
+        return
+    if not subsection_keys:
+        return
+    course_structure = get_course_blocks(student, modulestore().make_course_usage_key(course_key))
+    subsection_grade_factory = SubsectionGradeFactory(student, course_structure=course_structure)
+    for subsection_key in subsection_keys:
+        if subsection_key in course_structure:
+            subsection_grade_factory.update(course_structure[subsection_key], score_deleted=True)
+    CourseGradeFactory().update(student, course_structure=course_structure)
+
+
+def reset_course(course_key, student, requesting_user=None, on_progress=None, record=True):
+    """
+    Reset all of ``student``'s state in ``course_key``.
+    """
+    with instrument("reset_course"):
+        plan = plan_course_reset(course_key, student)
+        return execute_course_reset(
+            plan, requesting_user=requesting_user, on_progress=on_progress, record=record
+        )
+
+
+def defer_course_reset(course_key, student):
+    """
+    Reset ``student`` in ``course_key`` by starting a new state generation.
+
+    The enrollment's progress row is updated and the state and grade of its
+    StudentModule rows are cleared with a single UPDATE, so courseware shows
+    a fresh course right away. That statement still touches every row of the
+    enrollment. The cleared rows keep their old ``modified`` timestamp; they,
+    the submissions and the persisted grades are dealt with later by
+    ``purge_deferred_resets``. Until then reads of the course grade return a
+    zero grade (see ``request_cache.read_course_grade``).
+    """
+    from lms.djangoapps.courseware.models import StudentModule
+
+    with transaction.atomic():
+        cutoff = start_new_generation(student.id, course_key)
+        StudentModule.objects.filter(
+            student_id=student.id, course_id=course_key, modified__lte=cutoff
+        ).update(state="{}", grade=None, modified=cutoff)
+    mark_primary_sticky(student.id)
+    invalidate_progress(student.id, course_key)
+    log.info("Deferred reset of course %s for user %s (cutoff %s)", course_key, student.id, cutoff)
+    return cutoff
+
+
+def purge_deferred_resets(limit=None, sleep=None):
+    """
+    Delete state left behind by deferred resets, one enrollment at a time,
+    and regrade; rows saved after the generation cutoff are kept. Pauses
+    ``sleep`` seconds (``CUSTOM_VIEWS_PURGE_SLEEP``) between enrollments to
+    throttle writes. Returns the number of enrollments purged.
+    """
+    if sleep is None:
+        sleep = getattr(settings, "CUSTOM_VIEWS_PURGE_SLEEP", 0)
+    pending = EnrollmentProgress.objects.filter(purge_pending=True).select_related("user").order_by("id")
+    if limit:
+        pending = pending[:limit]
+    purged = 0
+    for progress in pending.iterator():
+        plan = plan_course_reset(
+            progress.course_id, progress.user, modified_before=progress.generation_cutoff
+        )
+        execute_course_reset(plan, record=False)
+        # A reset started meanwhile keeps the enrollment pending.
+        EnrollmentProgress.objects.filter(
+            id=progress.id, generation=progress.generation
+        ).update(purge_pending=False)
+        purged += 1
+        if sleep:
+            time.sleep(sleep)
+    return purged
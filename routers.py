@@ -0,0 +1,118 @@
+"""
+Opt-in read-replica routing for this plugin's read-only endpoints.
+
+Enable it by adding ``custom_views.routers.ReadReplicaRouter`` to
+``DATABASE_ROUTERS`` and setting ``CUSTOM_VIEWS_READ_REPLICA_ALIAS`` to a
+configured database alias. Only code wrapped in ``replica_reads`` is routed;
+everything else stays on the primary. Writes, and reads made for a write
+(``get_or_create``, ``select_for_update``), always go to the primary; code
+whose writes depend on what it reads runs under ``primary_reads``. Views
+using the replica must be ``non_atomic_requests``: the request transaction
+lives on the primary and replica reads would not see its writes.
+
+To keep learners from seeing their pre-reset state, a user's reads stick to
+the primary for ``CUSTOM_VIEWS_READ_REPLICA_STICKY_SECONDS`` after a reset.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, router
+
+DEFAULT_STICKY_SECONDS = 30
+STICKY_KEY = "custom_views.replica_sticky.{user_id}"
+
+_local = threading.local()
+
+
+def _replica_alias():
+    alias = getattr(settings, "CUSTOM_VIEWS_READ_REPLICA_ALIAS", None)
+    if alias and alias in settings.DATABASES:
+        return alias
+    return None
+
+
+def mark_primary_sticky(user_id):
+    """
+    Keep ``user_id``'s reads on the primary for the sticky window.
+    """
+    if _replica_alias() is None:
+        return
+    sticky_seconds = getattr(settings, "CUSTOM_VIEWS_READ_REPLICA_STICKY_SECONDS", DEFAULT_STICKY_SECONDS)
+    if sticky_seconds:
+        cache.set(STICKY_KEY.format(user_id=user_id), True, sticky_seconds)
+
+
+def _is_sticky(user_ids):
+    if not user_ids:
+        return False
+    return bool(cache.get_many([STICKY_KEY.format(user_id=user_id) for user_id in user_ids]))
+
+
+@contextmanager
+def _route_reads(alias):
+    previous = getattr(_local, "alias", None)
+    _local.alias = alias
+    try:
+        yield alias
+    finally:
+        _local.alias = previous
+
+
+def replica_reads(*user_ids):
+    """
+    Route reads made inside the block to the read replica, unless one of
+    ``user_ids`` recently reset a course.
+    """
+    alias = _replica_alias()
+    if alias is not None and _is_sticky(user_ids):
+        alias = None
+    return _route_reads(alias)
+
+
+def primary_reads():
+    """
+    Keep reads made inside the block on the primary, e.g. reads whose
+    result is written back.
+    """
+    return _route_reads(None)
+
+
+def _on_default_database(model):
+    # The other routers decide where the model lives; this one only ever
+    # answers for writes with None.
+    return router.db_for_write(model) == DEFAULT_DB_ALIAS
+
+
+class ReadReplicaRouter:
+    """
+    Send reads made inside ``replica_reads`` to the replica alias. Only
+    models living on the default database are routed; the replica is a copy
+    of that database alone.
+    """
+
+    def db_for_read(self, model, **hints):  # pylint: disable=unused-argument
+        # Querysets reading for a write (get_or_create, select_for_update)
+        # ask db_for_write instead.
+        alias = getattr(_local, "alias", None)
+        if alias is None or not _on_default_database(model):
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):  # pylint: disable=unused-argument
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):  # pylint: disable=unused-argument
+        # Objects read from the replica are the same rows as on the primary.
+        aliases = {DEFAULT_DB_ALIAS, _replica_alias()}
+        if (
+            {obj1._state.db, obj2._state.db} <= aliases  # pylint: disable=protected-access
+            and _on_default_database(type(obj1))
+            and _on_default_database(type(obj2))
+        ):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):  # pylint: disable=unused-argument
+        return None
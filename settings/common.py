@@ -17,3 +17,28 @@ def plugin_settings(settings):
     settings.ENABLE_CUSTOM_VIEWS = True
     settings.OVERRIDE_CHANGE_ENROLLMENT = "custom_views.overrides.change_enrollment"
     settings.OVERRIDE_PROGRESS = "custom_views.overrides.progress"
+    settings.CUSTOM_VIEWS_RESET_CHUNK_SIZE = 500
+    settings.CUSTOM_VIEWS_SQL_JSON_AGGREGATION = True
+    settings.CUSTOM_VIEWS_UNCOUNTED_BLOCK_TYPES = ("image-explorer",)
+    settings.CUSTOM_VIEWS_GRADES_BATCH_CHUNK_SIZE = 200
+    settings.CUSTOM_VIEWS_ASYNC_RESET = False
+    settings.CUSTOM_VIEWS_RESET_JOB_WORKERS = 2
+    settings.CUSTOM_VIEWS_RESET_JOB_STALE_AFTER = 15 * 60
+    settings.CUSTOM_VIEWS_COALESCE_RESET_GRADES = True
+    settings.CUSTOM_VIEWS_DEFERRED_RESET = False
+    settings.CUSTOM_VIEWS_PURGE_SLEEP = 0.1
+    settings.CUSTOM_VIEWS_BULK_RESET_CHUNK_SIZE = 50
+    settings.CUSTOM_VIEWS_SINGLE_FLIGHT_TIMEOUT = 120
+    settings.CUSTOM_VIEWS_SINGLE_FLIGHT_RESULT_TTL = 30
+    settings.CUSTOM_VIEWS_SINGLE_FLIGHT_LOCK_TTL = 60 * 60
+    # Read replica for read-only grade endpoints; requires
+    # custom_views.routers.ReadReplicaRouter in DATABASE_ROUTERS.
+    settings.CUSTOM_VIEWS_READ_REPLICA_ALIAS = None
+    settings.CUSTOM_VIEWS_READ_REPLICA_STICKY_SECONDS = 30
+    settings.CUSTOM_VIEWS_GRADES_RESPONSE_CACHE_TIMEOUT = 5 * 60
+    settings.CUSTOM_VIEWS_METRICS_SINKS = ("custom_views.instrumentation.LoggingSink",)
+    settings.CUSTOM_VIEWS_SERVER_TIMING = False
+    settings.CUSTOM_VIEWS_RECORD_REQUESTS = False
+    settings.CUSTOM_VIEWS_RECORD_SAMPLE_RATE = 0.01
+    settings.CUSTOM_VIEWS_RECORD_PATH = "/tmp/custom_views_traces.jsonl"
+    settings.CUSTOM_VIEWS_PROGRESS_CACHE_TIMEOUT = 5 * 60
@@ -66,3 +66,8 @@ TEMPLATES = [
 ]
 
 LANGUAGE_CODE = "en"
+
+# Run background course resets in-process.
+CUSTOM_VIEWS_RESET_JOBS_EAGER = True
+
+CUSTOM_VIEWS_METRICS_SINKS = ("custom_views.instrumentation.MemorySink",)
@@ -0,0 +1,53 @@
+"""
+Signal receivers for custom_views.
+
+The course publish receivers run in the LMS and Studio. The receivers keeping
+progress counters and pages fresh only make sense in the LMS; they are
+connected through the app's ``PluginSignals`` config for the LMS only, so
+Studio never imports the grades and progress modules they use.
+"""
+import logging
+
+from django.dispatch import receiver
+from xmodule.modulestore.django import SignalHandler
+
+from custom_views.block_index import invalidate_block_index
+from custom_views.catalog import invalidate_catalog
+
+log = logging.getLogger(__name__)
+
+
+@receiver(SignalHandler.course_published)
+def invalidate_block_index_on_publish(sender, course_key, **kwargs):  # pylint: disable=unused-argument
+    """
+    Drop the cached block index's version pointer whenever a course is
+    republished. Loading the whole course is too slow for the publish
+    request; the LMS rebuilds the index on its first read.
+    """
+    invalidate_block_index(course_key)
+
+
+@receiver(SignalHandler.course_published)
+def invalidate_catalog_on_publish(sender, course_key, **kwargs):  # pylint: disable=unused-argument
+    invalidate_catalog()
+
+
+@receiver(SignalHandler.course_deleted)
+def invalidate_catalog_on_delete(sender, course_key, **kwargs):  # pylint: disable=unused-argument
+    invalidate_catalog()
+
+
+def invalidate_progress_on_score_change(sender, user_id, course_id, **kwargs):  # pylint: disable=unused-argument
+    from custom_views.progress_cache import invalidate_progress
+    from custom_views.progress_counters import mark_progress_stale
+
+    # Covers StudentModule deletes made outside the reset engine, which no
+    # longer show up in the counters' staleness check.
+    mark_progress_stale(user_id, course_id)
+    invalidate_progress(user_id, course_id)
+
+
+def invalidate_progress_on_grade_change(sender, user, course_key, **kwargs):  # pylint: disable=unused-argument
+    from custom_views.progress_cache import invalidate_progress
+
+    invalidate_progress(user.id, course_key)
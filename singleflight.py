@@ -0,0 +1,170 @@
+"""
+Single-flight coordination for course resets.
+
+Only one reset per (user, course) runs at a time. A concurrent duplicate
+(double click, client retry) waits for the in-flight reset and returns its
+result instead of running its own. A call arriving once nothing is in flight
+runs normally, however soon after the previous one.
+
+The result is published for waiting duplicates when the leader's transaction
+commits. Between the leader returning and that commit its flight record
+stays in the cache, and new duplicates join it rather than run. If the leader
+fails, or rolls back and its record expires, a waiter runs the call itself.
+
+On MySQL the flight is guarded by a named ``GET_LOCK``; elsewhere by a
+``cache.add`` key.
+"""
+import hashlib
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WAIT_TIMEOUT = 120
+DEFAULT_RESULT_TTL = 30
+DEFAULT_LOCK_TTL = 60 * 60
+POLL_INTERVAL = 0.2
+
+LOCK_KEY = "custom_views.singleflight.lock.{key}"
+# Id of the call in flight, until its result is published.
+FLIGHT_KEY = "custom_views.singleflight.flight.{key}"
+RESULT_KEY = "custom_views.singleflight.result.{flight}"
+
+
+class SingleFlightTimeout(Exception):
+    """
+    The in-flight operation did not finish within the wait timeout.
+    """
+
+
+def reset_flight_key(user_id, course_key):
+    return f"reset.{user_id}.{course_key}"
+
+
+def _lock_name(key):
+    # MySQL lock names are limited to 64 characters.
+    return "cv." + hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class _MySQLLock:
+    def __init__(self, key):
+        self.name = _lock_name(key)
+
+    def acquire(self, timeout):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK(%s, %s)", [self.name, timeout])
+            return cursor.fetchone()[0] == 1
+
+    def release(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", [self.name])
+
+
+class _CacheLock:
+    def __init__(self, key):
+        self.key = LOCK_KEY.format(key=_lock_name(key))
+        self.token = str(uuid.uuid4())
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        # Must outlast the slowest reset; also how long a crashed holder
+        # blocks the key.
+        lock_ttl = getattr(settings, "CUSTOM_VIEWS_SINGLE_FLIGHT_LOCK_TTL", DEFAULT_LOCK_TTL)
+        while not cache.add(self.key, self.token, lock_ttl):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(POLL_INTERVAL)
+        return True
+
+    def release(self):
+        if cache.get(self.key) == self.token:
+            cache.delete(self.key)
+
+
+def _make_lock(key):
+    if connection.vendor == "mysql":
+        return _MySQLLock(key)
+    return _CacheLock(key)
+
+
+def _lead(lock, flight_key, func, wait_timeout, result_ttl):
+    """
+    Run ``func()`` holding ``lock`` and publish its result on commit.
+    """
+    flight = str(uuid.uuid4())
+    cache.set(flight_key, flight, wait_timeout)
+    try:
+        result = func()
+    except BaseException:
+        cache.delete(flight_key)
+        raise
+    else:
+        # Keeps duplicates joining until the commit; expires on its own if
+        # the transaction rolls back.
+        cache.set(flight_key, flight, result_ttl)
+    finally:
+        lock.release()
+
+    def publish():
+        cache.set(RESULT_KEY.format(flight=flight), {"result": result}, result_ttl)
+        if cache.get(flight_key) == flight:
+            cache.delete(flight_key)
+
+    transaction.on_commit(publish)
+    return result
+
+
+def _try_lead(lock, flight_key):
+    """
+    Take ``lock`` unless a finished leader is still waiting for its commit.
+    """
+    if not lock.acquire(0):
+        return False
+    if cache.get(flight_key) is not None:
+        lock.release()
+        return False
+    return True
+
+
+def single_flight(key, func, wait_timeout=None, result_ttl=None):
+    """
+    Run ``func()`` unless an equivalent call is in flight, and return
+    ``(result, shared)``: ``shared`` is True when the result came from
+    another caller's run. ``func`` must return a picklable value.
+    """
+    if wait_timeout is None:
+        wait_timeout = getattr(settings, "CUSTOM_VIEWS_SINGLE_FLIGHT_TIMEOUT", DEFAULT_WAIT_TIMEOUT)
+    if result_ttl is None:
+        result_ttl = getattr(settings, "CUSTOM_VIEWS_SINGLE_FLIGHT_RESULT_TTL", DEFAULT_RESULT_TTL)
+    flight_key = FLIGHT_KEY.format(key=_lock_name(key))
+    lock = _make_lock(key)
+    # Read before trying the lock, so a leader finishing right after we
+    # fail to take it is not missed.
+    flight = cache.get(flight_key)
+    if flight is None and _try_lead(lock, flight_key):
+        return _lead(lock, flight_key, func, wait_timeout, result_ttl), False
+
+    log.info("Joining in-flight operation %s", key)
+    deadline = time.monotonic() + wait_timeout
+    while True:
+        # Read before the result: it is published before the flight record
+        # goes away.
+        current = cache.get(flight_key)
+        if flight is not None:
+            published = cache.get(RESULT_KEY.format(flight=flight))
+            if published is not None:
+                return published["result"], True
+        if current is not None:
+            # Follow whichever call is in flight now.
+            flight = current
+        elif _try_lead(lock, flight_key):
+            # The call we waited for failed or rolled back: run our own.
+            return _lead(lock, flight_key, func, wait_timeout, result_ttl), False
+        if time.monotonic() >= deadline:
+            raise SingleFlightTimeout(key)
+        time.sleep(POLL_INTERVAL)
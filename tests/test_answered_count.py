@@ -0,0 +1,61 @@
+"""
+The SQL and Python paths of ``answered_count`` must agree.
+"""
+import json
+import unittest
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from opaque_keys.edx.keys import CourseKey
+
+from common.djangoapps.student.tests.factories import UserFactory
+from lms.djangoapps.courseware.tests.factories import StudentModuleFactory
+from custom_views.utils import answered_count
+
+COURSE_KEY = CourseKey.from_string("course-v1:Org+Course+Run")
+
+STATES = [
+    # The first row carries the reset count.
+    {"resetcount": 2, "attempts": 1},
+    {"correct_map": {"a": {}}},
+    {"item_state": {"x": 1}},
+    {"attempts": 0},
+    {"attempts": "3"},
+    {"correct_map": {}},
+    {"attempts": True},
+    "not json",
+    "[1, 2]",
+]
+
+
+class AnsweredCountTestCase(TestCase):
+    """
+    Answered problems and the reset count, in one query.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.student = UserFactory()
+        for position, state in enumerate(STATES):
+            StudentModuleFactory(
+                student=self.student,
+                course_id=COURSE_KEY,
+                module_type="problem",
+                module_state_key=COURSE_KEY.make_usage_key("problem", f"p{position}"),
+                state=state if isinstance(state, str) else json.dumps(state),
+            )
+
+    @override_settings(CUSTOM_VIEWS_SQL_JSON_AGGREGATION=False)
+    def test_python(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(answered_count(self.student.id, COURSE_KEY), (3, 2))
+
+    @unittest.skipUnless(connection.vendor == "mysql", "JSON aggregation runs on MySQL only")
+    def test_sql_matches_python(self):
+        with self.assertNumQueries(1):
+            sql = answered_count(self.student.id, COURSE_KEY)
+        with override_settings(CUSTOM_VIEWS_SQL_JSON_AGGREGATION=False):
+            self.assertEqual(sql, answered_count(self.student.id, COURSE_KEY))
+
+    def test_no_state(self):
+        self.assertEqual(answered_count(UserFactory().id, COURSE_KEY), (0, False))
@@ -0,0 +1,158 @@
+"""
+In-process tests of the background course reset jobs.
+"""
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from opaque_keys.edx.keys import CourseKey
+
+from common.djangoapps.student.tests.factories import UserFactory
+from custom_views import jobs
+from custom_views.bulk_reset import count_chunk_resets, create_bulk_reset_run
+from custom_views.models import EnrollmentProgress, ResetJob
+from custom_views.views import reset_job_status
+
+COURSE_KEY = CourseKey.from_string("course-v1:Org+Course+Run")
+
+
+@override_settings(CUSTOM_VIEWS_RESET_JOBS_EAGER=True, CUSTOM_VIEWS_RESET_JOB_STALE_AFTER=60)
+class ResetJobTestCase(TestCase):
+    """
+    Jobs run once, resume after a dead worker and count the reset once.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = UserFactory()
+        patcher = mock.patch("custom_views.reset.plan_course_reset", return_value=[object()] * 3)
+        self.plan = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch(
+            "custom_views.reset.execute_course_reset",
+            return_value=mock.Mock(modules_deleted=3, failures=[]),
+        )
+        self.execute = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _make_job(self, status, age=0):
+        job = ResetJob.objects.create(user=self.user, course_id=COURSE_KEY, status=status)
+        ResetJob.objects.filter(id=job.id).update(modified=timezone.now() - timedelta(seconds=age))
+        job.refresh_from_db()
+        return job
+
+    def _resetcount(self):
+        return EnrollmentProgress.objects.get(user_id=self.user.id, course_id=COURSE_KEY).resetcount
+
+    def test_submit_runs_job(self):
+        job, created = jobs.submit_reset_job(COURSE_KEY, self.user)
+        self.assertTrue(created)
+        self.assertEqual(job.status, ResetJob.SUCCEEDED)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.modules_total, 3)
+        self.assertEqual(job.modules_processed, 3)
+        self.assertTrue(job.counted)
+        self.assertEqual(self._resetcount(), 1)
+
+    def test_succeeded_job_not_run_again(self):
+        job, _created = jobs.submit_reset_job(COURSE_KEY, self.user)
+        jobs.run_reset_job(job.job_id)
+        self.execute.assert_called_once()
+        self.assertEqual(self._resetcount(), 1)
+
+    def test_running_job_not_run_twice(self):
+        job = self._make_job(ResetJob.RUNNING)
+        self.assertEqual(jobs.submit_reset_job(COURSE_KEY, self.user), (job, False))
+        jobs.run_reset_job(job.job_id)
+        self.execute.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ResetJob.RUNNING)
+
+    def test_stale_job_resumed(self):
+        job = self._make_job(ResetJob.RUNNING, age=120)
+        ResetJob.objects.filter(id=job.id).update(attempts=1, counted=True, modules_processed=2)
+        jobs.submit_reset_job(COURSE_KEY, self.user)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ResetJob.SUCCEEDED)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(job.modules_processed, 5)
+        self.assertTrue(self.execute.call_args[1]["full_regrade"])
+        # Counted by the first attempt.
+        self.assertFalse(EnrollmentProgress.objects.filter(user_id=self.user.id).exists())
+
+    def test_resume_stale_jobs(self):
+        self._make_job(ResetJob.RUNNING, age=120)
+        self._make_job(ResetJob.RUNNING)
+        self.assertEqual(jobs.resume_stale_jobs(), 1)
+        self.execute.assert_called_once()
+
+    def test_bulk_run_jobs_left_to_their_run(self):
+        run = create_bulk_reset_run(COURSE_KEY, [self.user.id], "users")
+        ResetJob.objects.filter(bulk_run=run).update(modified=timezone.now() - timedelta(seconds=120))
+        self.assertEqual(jobs.resume_stale_jobs(), 0)
+        job, created = jobs.submit_reset_job(COURSE_KEY, self.user)
+        self.assertTrue(created)
+        self.assertIsNone(job.bulk_run)
+
+    def test_bulk_chunk_counted_once(self):
+        run = create_bulk_reset_run(COURSE_KEY, [self.user.id], "users")
+        count_chunk_resets(run, [self.user.id])
+        count_chunk_resets(run, [self.user.id])
+        self.assertTrue(ResetJob.objects.get(bulk_run=run).counted)
+        self.assertEqual(self._resetcount(), 1)
+
+    def test_claim_lost_to_other_worker(self):
+        job = self._make_job(ResetJob.PENDING, age=120)
+        # Another worker claims the job after this one read it.
+        ResetJob.objects.filter(id=job.id).update(modified=timezone.now())
+        self.assertFalse(jobs._claim_job(job))  # pylint: disable=protected-access
+        job.refresh_from_db()
+        self.assertTrue(jobs._claim_job(job))  # pylint: disable=protected-access
+
+    def test_progress_moves_heartbeat(self):
+        job = self._make_job(ResetJob.PENDING, age=120)
+        heartbeats = []
+
+        def execute(plan, on_progress=None, **kwargs):  # pylint: disable=unused-argument
+            on_progress(mock.Mock(modules_deleted=1, failures=[]))
+            heartbeats.append(ResetJob.objects.get(id=job.id).modified)
+            return mock.Mock(modules_deleted=3, failures=[])
+
+        self.execute.side_effect = execute
+        jobs.run_reset_job(job.job_id)
+        self.assertFalse(jobs._is_stale(mock.Mock(modified=heartbeats[0])))  # pylint: disable=protected-access
+
+    def test_failed_job(self):
+        self.execute.side_effect = ValueError("boom")
+        job, _created = jobs.submit_reset_job(COURSE_KEY, self.user)
+        self.assertEqual(job.status, ResetJob.FAILED)
+        self.assertEqual(job.error, "boom")
+
+
+class ResetJobStatusTestCase(TestCase):
+    """
+    Only staff and the job's learner or requester may read its status.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = UserFactory()
+        self.requester = UserFactory()
+        self.job = ResetJob.objects.create(user=self.user, requested_by=self.requester, course_id=COURSE_KEY)
+
+    def _get(self, user):
+        request = RequestFactory().get("/")
+        request.user = user
+        return reset_job_status(request, self.job.job_id)
+
+    def test_anonymous_redirected_to_login(self):
+        self.assertEqual(self._get(AnonymousUser()).status_code, 302)
+
+    def test_other_learner_forbidden(self):
+        self.assertEqual(self._get(UserFactory()).status_code, 403)
+
+    def test_allowed(self):
+        for user in (self.user, self.requester, UserFactory(is_staff=True)):
+            self.assertEqual(self._get(user).status_code, 200)
@@ -0,0 +1,87 @@
+"""
+Query-count tests for the request-scoped course and grade memoization.
+"""
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+from edx_django_utils.cache import RequestCache
+from opaque_keys.edx.keys import CourseKey
+
+from common.djangoapps.student.tests.factories import UserFactory
+from custom_views import request_cache
+from custom_views.models import EnrollmentProgress
+from custom_views.utils import get_grades
+
+COURSE_KEY = CourseKey.from_string("course-v1:Org+Course+Run")
+
+
+class RequestCacheTestCase(TestCase):
+    """
+    Each course and course grade is computed at most once per request.
+    """
+
+    def setUp(self):
+        super().setUp()
+        RequestCache.clear_all_namespaces()
+        self.addCleanup(RequestCache.clear_all_namespaces)
+        self.student = UserFactory()
+        self.course = mock.Mock(id=COURSE_KEY)
+        self.course_grade = mock.Mock(passed=True, percent=0.5, letter_grade="Pass")
+
+        patcher = mock.patch(
+            "lms.djangoapps.courseware.courses.get_course_by_id", return_value=self.course
+        )
+        self.get_course_by_id = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("lms.djangoapps.grades.api.CourseGradeFactory")
+        self.factory = patcher.start()
+        self.factory.return_value.read.return_value = self.course_grade
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("custom_views.utils.get_block_index")
+        index = patcher.start().return_value
+        index.has_variable_content = False
+        index.countable_problem_count.return_value = 10
+        self.addCleanup(patcher.stop)
+
+    def test_course_read_once(self):
+        self.assertIs(request_cache.get_course_by_id(COURSE_KEY), self.course)
+        with self.assertNumQueries(0):
+            self.assertIs(request_cache.get_course_by_id(COURSE_KEY), self.course)
+        self.get_course_by_id.assert_called_once_with(COURSE_KEY)
+
+    def test_course_grade_read_once(self):
+        request_cache.read_course_grade(self.student, self.course)
+        with self.assertNumQueries(0):
+            self.assertIs(request_cache.read_course_grade(self.student, self.course), self.course_grade)
+        self.factory.return_value.read.assert_called_once_with(self.student, self.course)
+
+    def test_course_grade_zero_while_purge_pending(self):
+        EnrollmentProgress.objects.create(user_id=self.student.id, course_id=COURSE_KEY, purge_pending=True)
+        with mock.patch("custom_views.request_cache.zero_course_grade") as zero_course_grade:
+            course_grade = request_cache.read_course_grade(self.student, self.course)
+        self.assertIs(course_grade, zero_course_grade.return_value)
+        self.factory.return_value.read.assert_not_called()
+
+    def test_clear_course_grade(self):
+        request_cache.read_course_grade(self.student, self.course)
+        request_cache.clear_course_grade(self.student.id, COURSE_KEY)
+        request_cache.read_course_grade(self.student, self.course)
+        self.assertEqual(self.factory.return_value.read.call_count, 2)
+
+    def test_get_grades_queries(self):
+        EnrollmentProgress.objects.create(
+            user_id=self.student.id, course_id=COURSE_KEY, answered=3, computed_at=timezone.now()
+        )
+        # The student, the pending-purge check, the progress row and its
+        # staleness check.
+        with self.assertNumQueries(4):
+            grades = get_grades(str(COURSE_KEY), self.student.id, detail="course")
+        self.assertEqual(grades["username"], self.student.username)
+        self.assertFalse(grades["reset"])
+
+        # The course and the grade come from the request cache.
+        with self.assertNumQueries(3):
+            get_grades(str(COURSE_KEY), self.student.id, detail="course")
+        self.get_course_by_id.assert_called_once_with(COURSE_KEY)
+        self.factory.return_value.read.assert_called_once_with(self.student, self.course)
@@ -0,0 +1,128 @@
+"""
+In-process tests of deferred resets and duplicate reset requests.
+"""
+from datetime import timedelta
+from unittest import mock
+
+from amat_analytics.models import EmployeeResetCount
+from django.test import RequestFactory, TestCase, override_settings
+from opaque_keys.edx.keys import CourseKey
+
+from common.djangoapps.student.models import anonymous_id_for_user
+from common.djangoapps.student.tests.factories import CourseEnrollmentFactory, UserFactory
+from lms.djangoapps.courseware.models import StudentModule
+from lms.djangoapps.courseware.tests.factories import StudentModuleFactory
+from submissions.models import StudentItem
+from custom_views import overrides
+from custom_views.block_index import BlockRecord, CourseBlockIndex
+from custom_views.models import EnrollmentProgress, ResetJob
+from custom_views.reset import defer_course_reset, purge_deferred_resets
+
+COURSE_KEY = CourseKey.from_string("course-v1:Org+Course+Run")
+SEQUENTIAL_KEY = COURSE_KEY.make_usage_key("sequential", "sequential")
+PROBLEM_KEY = COURSE_KEY.make_usage_key("problem", "problem")
+
+
+def _record(usage_key, children=(), has_score=False):
+    return BlockRecord(
+        usage_key=str(usage_key),
+        block_type=usage_key.block_type,
+        children=tuple(str(child) for child in children),
+        has_score=has_score,
+        max_score=1 if has_score else None,
+        weight=None,
+        has_clear_student_state=False,
+        group_access=False,
+        staff_only=False,
+        start=None,
+    )
+
+
+class PurgeDeferredResetTestCase(TestCase):
+    """
+    The purge deletes the old generation and nothing saved since the cutoff.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.student = UserFactory()
+        index = CourseBlockIndex(
+            COURSE_KEY,
+            "version",
+            {
+                str(SEQUENTIAL_KEY): _record(SEQUENTIAL_KEY, children=(PROBLEM_KEY,)),
+                str(PROBLEM_KEY): _record(PROBLEM_KEY, has_score=True),
+            },
+            subsections={str(PROBLEM_KEY): str(SEQUENTIAL_KEY)},
+        )
+        for target, value in (
+            ("custom_views.reset.get_block_index", index),
+            ("custom_views.reset.update_grades_after_reset", None),
+        ):
+            patcher = mock.patch(target, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch("submissions.api.reset_score")
+        self.reset_score = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _module(self, usage_key):
+        return StudentModuleFactory(
+            student=self.student,
+            course_id=COURSE_KEY,
+            module_type=usage_key.block_type,
+            module_state_key=usage_key,
+            state='{"attempts": 1}',
+        )
+
+    def test_row_saved_after_cutoff_under_old_parent(self):
+        sequential = self._module(SEQUENTIAL_KEY)
+        problem = self._module(PROBLEM_KEY)
+        StudentItem.objects.create(
+            student_id=anonymous_id_for_user(self.student, COURSE_KEY),
+            course_id=str(COURSE_KEY),
+            item_id=str(PROBLEM_KEY),
+            item_type="problem",
+        )
+        cutoff = defer_course_reset(COURSE_KEY, self.student)
+        # The learner answers the problem again after the deferred reset.
+        StudentModule.objects.filter(id=problem.id).update(
+            state='{"attempts": 1}', modified=cutoff + timedelta(minutes=1)
+        )
+
+        self.assertEqual(purge_deferred_resets(sleep=0), 1)
+
+        self.assertFalse(StudentModule.objects.filter(id=sequential.id).exists())
+        self.assertEqual(StudentModule.objects.get(id=problem.id).state, '{"attempts": 1}')
+        self.reset_score.assert_not_called()
+        self.assertFalse(EnrollmentProgress.objects.get(user_id=self.student.id).purge_pending)
+
+
+@override_settings(CUSTOM_VIEWS_ASYNC_RESET=True, CUSTOM_VIEWS_RESET_JOBS_EAGER=False)
+class DuplicateResetTestCase(TestCase):
+    """
+    A reset submitted again while its job is queued is counted once.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.enrollment = CourseEnrollmentFactory(course_id=COURSE_KEY)
+        # Keep the queued job from running in a worker thread.
+        patcher = mock.patch("custom_views.jobs._get_executor")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _reset(self):
+        request = RequestFactory().post("/", {"enrollment_action": "reset", "course_id": str(COURSE_KEY)})
+        request.user = self.enrollment.user
+        with self.captureOnCommitCallbacks(execute=True):
+            return overrides.change_enrollment(mock.Mock(), request)
+
+    def test_duplicate_async_reset(self):
+        first = self._reset()
+        second = self._reset()
+        self.assertEqual(first["X-Reset-Job-Id"], second["X-Reset-Job-Id"])
+        self.assertEqual(ResetJob.objects.filter(user=self.enrollment.user).count(), 1)
+        self.assertEqual(
+            EmployeeResetCount.objects.get(course_enrollment_id=self.enrollment.id).reset_count, 1
+        )
@@ -3,9 +3,15 @@
 from django.conf.urls import url
 
 from .views import (
+    CourseCatalogListView,
+    bulk_reset_course,
+    bulk_reset_status,
     capture_credit_requested,
     credit_requested_details,
     get_grades_api,
+    get_grades_batch_api,
+    reset_job_status,
+    reset_statistics_api,
     service_reset_course,
 )
 
@@ -25,5 +31,19 @@ urlpatterns = [
         service_reset_course,
         name="capture_credit_requested",
     ),
+    url(
+        r"^services_reset_course/status/(?P<job_id>[0-9a-f-]+)/$",
+        reset_job_status,
+        name="reset_job_status",
+    ),
+    url(r"^services_reset_course/bulk/$", bulk_reset_course, name="bulk_reset_course"),
+    url(
+        r"^services_reset_course/bulk/(?P<run_id>[0-9a-f-]+)/$",
+        bulk_reset_status,
+        name="bulk_reset_status",
+    ),
+    url(r"^courses/$", CourseCatalogListView.as_view(), name="course_catalog"),
+    url(r"^reset_statistics$", reset_statistics_api, name="reset_statistics"),
+    url(r"^get_grades_api/batch$", get_grades_batch_api, name="get_grades_batch_api"),
     url(r"^get_grades_api", get_grades_api, name="get_grades_api"),
 ]
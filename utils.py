@@ -1,113 +1,243 @@
+"""
+Grades, progress and reset helpers.
+
+LMS apps (grades, courseware, instructor, submissions, branding...) are
+imported inside the functions that use them: this module is loaded at app
+startup through the signal receivers, in Studio as well as in the LMS.
+"""
 import json
 import logging
 from datetime import datetime
 
-from lms.djangoapps.branding import get_visible_courses
 import pytz
-from opaque_keys.edx.keys import CourseKey
-from common.djangoapps.student.models import anonymous_id_for_user
-from common.djangoapps.track.event_transaction_utils import (
-    create_new_event_transaction_id,
-    get_event_transaction_id,
-    set_event_transaction_type,
-)
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.contrib.auth.models import User
-from eventtracking import tracker
-from lms.djangoapps.course_api.api import get_effective_user
-from lms.djangoapps.courseware import courses
-from lms.djangoapps.courseware.models import StudentModule
-from lms.djangoapps.grades.api import CourseGradeFactory
-from lms.djangoapps.grades.constants import ScoreDatabaseTableEnum
-from lms.djangoapps.grades.signals.handlers import (
-    disconnect_submissions_signal_receiver,
-)
-from lms.djangoapps.grades.signals.signals import PROBLEM_RAW_SCORE_CHANGED
-from lms.djangoapps.instructor.enrollment import _reset_module_attempts
-from submissions import api as sub_api
-from submissions.models import score_set
-from xmodule.modulestore.django import modulestore
-from xmodule.modulestore.exceptions import ItemNotFoundError
+from django.db import connections
+from django.db.models import Count, IntegerField, Max, Subquery, Sum, TextField
+from django.db.models.expressions import RawSQL
+from opaque_keys.edx.keys import CourseKey
+
+from custom_views.block_index import DEFAULT_UNCOUNTED_BLOCK_TYPES, get_block_index, record_for_block
+from custom_views.catalog import course_projection, get_course_catalog
+from custom_views.grade_summary import DEFAULT_DETAIL, serialize_courseware_summary
+from custom_views.instrumentation import incr, instrument, phase
+from custom_views.request_cache import get_course_by_id, read_course_grade, zero_course_grade
+from custom_views.routers import primary_reads, replica_reads
 
 
 log = logging.getLogger(__name__)
 USER_MODEL = get_user_model()
 
 
-def answered_count(student_id, course_id):
+ANSWERABLE_MODULE_TYPES = ("problem", "drag-and-drop-v2")
+
+# MySQL expression mirroring _is_answered_state on the raw ``state`` text
+# column. CASE is used so invalid JSON is never passed to the JSON functions.
+_MYSQL_ANSWERED_SQL = (
+    "CASE WHEN NOT JSON_VALID(state) THEN 0 "
+    "WHEN JSON_TYPE(JSON_EXTRACT(state, '$.correct_map')) = 'OBJECT' "
+    "AND JSON_LENGTH(state, '$.correct_map') > 0 THEN 1 "
+    "WHEN JSON_TYPE(JSON_EXTRACT(state, '$.item_state')) = 'OBJECT' "
+    "AND JSON_LENGTH(state, '$.item_state') > 0 THEN 1 "
+    "WHEN JSON_TYPE(JSON_EXTRACT(state, '$.attempts')) IN ('INTEGER', 'UNSIGNED INTEGER', 'DOUBLE', 'DECIMAL') "
+    "AND CAST(JSON_EXTRACT(state, '$.attempts') AS DECIMAL(20, 6)) > 0 THEN 1 "
+    "ELSE 0 END"
+)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_answered_state(state):
+    """
+    A problem counts as answered when it has a non-empty ``correct_map`` or
+    ``item_state`` object, or a positive numeric ``attempts``.
+    """
+    correct_map = state.get("correct_map")
+    item_state = state.get("item_state")
+    attempts = state.get("attempts")
+    return (
+        (isinstance(correct_map, dict) and bool(correct_map))
+        or (isinstance(item_state, dict) and bool(item_state))
+        or (_is_number(attempts) and attempts > 0)
+    )
+
+
+def _parse_state(raw_state):
+    try:
+        state = json.loads(raw_state or "{}")
+    except ValueError:
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def _resetcount(raw_state):
+    """
+    The ``resetcount`` recorded in a raw state, as an int, or None.
+    """
+    state = _parse_state(raw_state)
+    resetcount = state.get("resetcount") if state is not None else None
+    return int(resetcount) if _is_number(resetcount) else None
+
+
+def _use_sql_json_aggregation(queryset):
+    if not getattr(settings, "CUSTOM_VIEWS_SQL_JSON_AGGREGATION", True):
+        return False
+    return connections[queryset.db].vendor == "mysql"
+
+
+def _answered_count_sql(problems):
+    # The first row's state rides along as a scalar subquery; MAX only makes
+    # it a valid aggregate.
+    first_state = Subquery(problems.order_by("id").values("state")[:1])
+    totals = problems.aggregate(
+        rows=Count("id"),
+        answered=Sum(RawSQL(_MYSQL_ANSWERED_SQL, [], output_field=IntegerField()), output_field=IntegerField()),
+        first_state=Max(first_state, output_field=TextField()),
+    )
+    return totals["rows"], int(totals["answered"] or 0), totals["first_state"]
+
+
+def _answered_count_python(problems):
+    rows = 0
+    answered = 0
+    first_state = None
+    for raw_state in problems.order_by("id").values_list("state", flat=True).iterator():
+        if not rows:
+            first_state = raw_state
+        rows += 1
+        state = _parse_state(raw_state)
+        if state is not None and _is_answered_state(state):
+            answered += 1
+    return rows, answered, first_state
+
+
+def answered_count(student_id, course_id, modified_after=None):
+    """
+    Return ``(answered, reset)`` for the student's answerable modules: the
+    number of answered problems and the ``resetcount`` recorded in the first
+    of them, read in a single query. ``reset`` is False when
+    there is no state at all.
+
+    Rows last modified at or before ``modified_after`` (a deferred reset's
+    cutoff) are treated as absent.
+    """
+    from lms.djangoapps.courseware.models import StudentModule
+
     problems = StudentModule.objects.filter(
-        student=student_id, course_id=course_id, module_type="problem"
-    ) | StudentModule.objects.filter(
-        student=student_id, course_id=course_id, module_type="drag-and-drop-v2"
+        student=student_id,
+        course_id=course_id,
+        module_type__in=ANSWERABLE_MODULE_TYPES,
     )
-    if problems:
-        answered = 0
-        for s in problems:
-            log.info(json.loads(s.state))
-            if json.loads(s.state).get("correct_map"):
-                answered += 1
-            elif json.loads(s.state).get("item_state"):
-                answered += 1
-            elif json.loads(s.state).get("attempts"):
-                answered += 1
-        is_reset = json.loads(problems[0].state).get("resetcount")
-        return answered, is_reset
+    if modified_after is not None:
+        problems = problems.filter(modified__gt=modified_after)
+    if _use_sql_json_aggregation(problems):
+        rows, answered, first_state = _answered_count_sql(problems)
+    else:
+        rows, answered, first_state = _answered_count_python(problems)
+    if not rows:
+        return 0, False
+    return answered, _resetcount(first_state)
 
 
 def reset_student_attempts(
-    course_id, student, module_state_key, requesting_user, delete_module=False
+    course_id, student, module_state_key, requesting_user, delete_module=False, context=None
 ):
-    user_id = anonymous_id_for_user(student, course_id)
-    requesting_user = User.objects.get(username="staff")
-    requesting_user_id = anonymous_id_for_user(requesting_user, course_id)
+    """
+    Reset (or delete) one module's state and its children's.
+
+    ``requesting_user`` may be None, in which case the "staff" user is used.
+    ``context`` carries the resolved users and anonymous ids through the
+    recursion; it is created on the first call.
+    """
+    from common.djangoapps.track.event_transaction_utils import (
+        create_new_event_transaction_id,
+        get_event_transaction_id,
+        set_event_transaction_type,
+    )
+    from eventtracking import tracker
+    from lms.djangoapps.courseware.models import StudentModule
+    from lms.djangoapps.grades.signals.handlers import disconnect_submissions_signal_receiver
+    from lms.djangoapps.instructor.enrollment import _reset_module_attempts
+    from submissions import api as sub_api
+    from submissions.models import score_set
+    from xmodule.modulestore.django import modulestore
+    from xmodule.modulestore.exceptions import ItemNotFoundError
+
+    from custom_views.reset import DELETE_FIELDS, ResetContext
+
+    if context is None:
+        with instrument("reset_student_attempts"):
+            return reset_student_attempts(
+                course_id,
+                student,
+                module_state_key,
+                requesting_user,
+                delete_module=delete_module,
+                context=ResetContext(course_id, student, requesting_user),
+            )
+    user_id = context.student_anonymous_id
+    requesting_user = context.requesting_user
+    requesting_user_id = context.requesting_user_anonymous_id
     submission_cleared = False
-    try:
-        # A block may have children. Clear state on children first.
-        block = modulestore().get_item(module_state_key)
-        if block.has_children:
-            for child in block.children:
-                try:
-                    reset_student_attempts(
-                        course_id,
-                        student,
-                        child,
-                        requesting_user,
-                        delete_module=delete_module,
-                    )
-                except StudentModule.DoesNotExist:
-                    # If a particular child doesn't have any state, no big deal, as long as the parent does.
-                    pass
-        if delete_module:
+    # A block may have children. Clear state on children first.
+    with phase("modulestore"):
+        block_record = get_block_index(course_id).get(module_state_key)
+        if block_record is None:
+            try:
+                block_record = record_for_block(modulestore().get_item(module_state_key))
+            except ItemNotFoundError:
+                log.warning(
+                    "Could not find %s in modulestore when attempting to reset attempts.",
+                    module_state_key,
+                )
+    if block_record is not None:
+        for child in block_record.children:
+            try:
+                reset_student_attempts(
+                    course_id,
+                    student,
+                    child,
+                    requesting_user,
+                    delete_module=delete_module,
+                    context=context,
+                )
+            except StudentModule.DoesNotExist:
+                # If a particular child doesn't have any state, no big deal, as long as the parent does.
+                pass
+        if delete_module and block_record.has_clear_student_state:
             # Some blocks (openassessment) use StudentModule data as a key for internal submission data.
             # Inform these blocks of the reset and allow them to handle their data.
-            clear_student_state = getattr(block, "clear_student_state", None)
-            if callable(clear_student_state):
-                with disconnect_submissions_signal_receiver(score_set):
-                    clear_student_state(
-                        user_id=user_id,
-                        course_id=str(course_id),
-                        item_id=str(module_state_key),
-                        requesting_user_id=requesting_user_id,
-                    )
-                submission_cleared = True
-    except ItemNotFoundError:
-        block = None
-        log.warning(
-            "Could not find %s in modulestore when attempting to reset attempts.",
-            module_state_key,
-        )
+            with phase("clear_state"), disconnect_submissions_signal_receiver(score_set):
+                block = modulestore().get_item(module_state_key)
+                block.clear_student_state(
+                    user_id=user_id,
+                    course_id=str(course_id),
+                    item_id=str(module_state_key),
+                    requesting_user_id=requesting_user_id,
+                )
+            submission_cleared = True
     if delete_module and not submission_cleared:
-        sub_api.reset_score(
-            user_id,
-            course_id.to_deprecated_string(),
-            module_state_key.to_deprecated_string(),
-        )
+        with phase("submissions"):
+            sub_api.reset_score(
+                user_id,
+                course_id.to_deprecated_string(),
+                module_state_key.to_deprecated_string(),
+            )
 
-    module_to_reset = StudentModule.objects.get(
+    modules = StudentModule.objects.filter(
         student_id=student.id, course_id=course_id, module_state_key=module_state_key
     )
     if delete_module:
-        module_to_reset.delete()
+        # The state is about to be deleted, don't load it.
+        modules = modules.only(*DELETE_FIELDS)
+    with phase("delete"):
+        module_to_reset = modules.get()
+        if delete_module:
+            module_to_reset.delete()
+    incr("modules")
+    if delete_module:
         create_new_event_transaction_id()
         grade_update_root_type = "edx.grades.problem.state_deleted"
         set_event_transaction_type(grade_update_root_type)
@@ -123,84 +253,212 @@ def reset_student_attempts(
             },
         )
         if not submission_cleared:
-            _fire_score_changed_for_block(
-                course_id,
-                student,
-                block,
-                module_state_key,
-            )
+            with phase("grade_signals"):
+                _fire_score_changed_for_block(
+                    course_id,
+                    student,
+                    block_record,
+                    module_state_key,
+                )
     else:
-        _reset_module_attempts(module_to_reset)
+        with phase("delete"):
+            _reset_module_attempts(module_to_reset)
 
 
 def _fire_score_changed_for_block(
     course_id,
     student,
-    block,
+    block_record,
     module_state_key,
 ):
     """
     Fires a PROBLEM_RAW_SCORE_CHANGED event for the given module.
-    The earned points are always zero. We must retrieve the possible points
-    from the XModule, as noted below. The effective time is now().
+    The earned points are always zero. The possible points come from the
+    course block index. The effective time is now().
     """
-    if block and block.has_score:
-        max_score = block.max_score()
+    from lms.djangoapps.grades.constants import ScoreDatabaseTableEnum
+    from lms.djangoapps.grades.signals.signals import PROBLEM_RAW_SCORE_CHANGED
+
+    if block_record and block_record.has_score:
+        max_score = block_record.max_score
         if max_score is not None:
             PROBLEM_RAW_SCORE_CHANGED.send(
                 sender=None,
                 raw_earned=0,
                 raw_possible=max_score,
-                weight=getattr(block, "weight", None),
+                weight=block_record.weight,
                 user_id=student.id,
                 course_id=str(course_id),
                 usage_id=str(module_state_key),
                 score_deleted=True,
                 only_if_higher=False,
-                modified=datetime.datetime.now().replace(tzinfo=pytz.UTC),
+                modified=datetime.now().replace(tzinfo=pytz.UTC),
                 score_db_table=ScoreDatabaseTableEnum.courseware_student_module,
             )
 
 
-def get_grades(course_id, student_id):
-    student = USER_MODEL.objects.get(id=int(student_id))
+def to_course_key(course_id):
     if isinstance(course_id, str):
         course_id = course_id.replace(" ", "+")
         course_id = CourseKey.from_string(course_id)
-    course = courses.get_course_by_id(course_id)
-    course_grade = CourseGradeFactory().read(student, course)
-    courseware_summary = list(course_grade.chapter_grades.values())
-    answered, reset, count = calculate_grade_stats(student.id, course.id, courseware_summary)
+    return course_id
+
+
+def _grade_details(student, course, course_grade, detail=DEFAULT_DETAIL, progress=None):
+    """
+    ``progress`` is the learner's ``(answered, reset)`` when already known.
+    Only the reset flag is reported, so the problem count, and the chapter
+    grades and block index it may need, are never computed here.
+    """
+    from custom_views.progress_counters import get_progress_counts
+
+    if progress is None:
+        progress = get_progress_counts(student.id, course.id)
+    _answered, reset = progress
     return {
             "username": student.username,
             "passed": course_grade.passed,
             "percent": course_grade.percent,
             "letter_grade": course_grade.letter_grade,
-            "courseware_summary": str(courseware_summary),
+            "courseware_summary": serialize_courseware_summary(course_grade, detail),
             "reset": reset,
         }
 
 
-def calculate_grade_stats(student_id: str, course_id: str, courseware_summary: list = []) -> tuple:
+def get_grades(course_id, student_id, detail=DEFAULT_DETAIL):
+    with instrument("get_grades"), replica_reads(int(student_id)):
+        with phase("course"):
+            student = USER_MODEL.objects.get(id=int(student_id))
+            course_id = to_course_key(course_id)
+            course = get_course_by_id(course_id)
+        with phase("grades"):
+            course_grade = read_course_grade(student, course)
+        with phase("serialize"):
+            return _grade_details(student, course, course_grade, detail)
+
+
+def _roster_user_ids(course_key, chunk_size):
+    """
+    Yield chunks of active learner ids in ``course_key`` using keyset pagination.
+    """
+    from common.djangoapps.student.models import CourseEnrollment
+
+    last_user_id = 0
+    while True:
+        with replica_reads():
+            chunk = list(
+                CourseEnrollment.objects.filter(
+                    course_id=course_key, is_active=True, user_id__gt=last_user_id
+                )
+                .order_by("user_id")
+                .values_list("user_id", flat=True)[:chunk_size]
+            )
+        if not chunk:
+            return
+        yield chunk
+        last_user_id = chunk[-1]
+
+
+def iter_grades(course_id, student_ids=None, chunk_size=None, detail=DEFAULT_DETAIL):
+    """
+    Yield grade details for many learners of one course.
+
+    The course is loaded once, users are fetched in bulk per chunk and grades
+    are read through ``CourseGradeFactory().iter`` so only one chunk is held
+    in memory at a time. Progress counters are read in bulk per chunk.
+    Without ``student_ids`` the whole active roster is used.
+    """
+    from lms.djangoapps.courseware import courses
+
+    chunk_size = chunk_size or getattr(settings, "CUSTOM_VIEWS_GRADES_BATCH_CHUNK_SIZE", 200)
+    course_key = to_course_key(course_id)
+    course = courses.get_course_by_id(course_key)
+    if student_ids is None:
+        id_chunks = _roster_user_ids(course_key, chunk_size)
+    else:
+        student_ids = [int(student_id) for student_id in student_ids]
+        id_chunks = (
+            student_ids[start:start + chunk_size]
+            for start in range(0, len(student_ids), chunk_size)
+        )
+    for chunk in id_chunks:
+        # Collected per chunk so the replica routing does not outlive a yield.
+        with replica_reads(*chunk):
+            chunk_grades = list(_chunk_grades(course, chunk, detail))
+        yield from chunk_grades
+
+
+def _chunk_grades(course, student_ids, detail):
+    from lms.djangoapps.grades.api import CourseGradeFactory
+
+    from custom_views.models import EnrollmentProgress
+    from custom_views.progress_counters import get_progress_counts_in_bulk
+
+    course_key = course.id
+    users = USER_MODEL.objects.in_bulk(student_ids)
+    for student_id in student_ids:
+        if student_id not in users:
+            yield {"student_id": student_id, "course_id": str(course_key), "error": "Unknown student"}
+    students = [users[student_id] for student_id in student_ids if student_id in users]
+    progress = get_progress_counts_in_bulk([student.id for student in students], course_key)
+    purge_pending = set(
+        EnrollmentProgress.objects.filter(
+            user_id__in=[student.id for student in students], course_id=course_key, purge_pending=True,
+        ).values_list("user_id", flat=True)
+    )
+    # Reading a grade may compute and save it: keep those reads on the primary.
+    with primary_reads():
+        results = list(CourseGradeFactory().iter(students, course=course))
+    for result in results:
+        if result.error:
+            yield {
+                "student_id": result.student.id,
+                "course_id": str(course_key),
+                "error": str(result.error),
+            }
+            continue
+        course_grade = result.course_grade
+        if result.student.id in purge_pending:
+            course_grade = zero_course_grade(result.student, course)
+        details = _grade_details(
+            result.student, course, course_grade, detail, progress[result.student.id]
+        )
+        details.update({"student_id": result.student.id, "course_id": str(course_key)})
+        yield details
+
+
+def _count_problem_scores(courseware_summary):
+    uncounted = getattr(settings, "CUSTOM_VIEWS_UNCOUNTED_BLOCK_TYPES", DEFAULT_UNCOUNTED_BLOCK_TYPES)
+    return sum(
+        1
+        for chapter in courseware_summary
+        for section in chapter.get("sections", [])
+        for usage_key in section.problem_scores
+        if usage_key.block_type not in uncounted
+    )
+
+
+def calculate_grade_stats(
+    student_id: str, course_id: str, courseware_summary: list = [], course_grade=None
+) -> tuple:
     """
     Calculate if the course can be reset.
+
+    The problem count comes from the course block index, computed once per
+    published course version. Courses with randomized or group-restricted
+    content count the learner's own problems instead, from
+    ``courseware_summary`` or ``course_grade``.
     """
-    answered = 0
-    reset = False
-    if StudentModule.objects.filter(
-        student=student_id, course_id=course_id, module_type="problem"
-    ):
-        answered, reset = answered_count(student_id, course_id)
-    count = 0
-    image_explorer_count = 0
-    for sections in courseware_summary:
-        for section in sections.get("sections", []):
-            for item in section.problem_scores:
-                if item.block_type == 'image-explorer':
-                    image_explorer_count += 1
-
-            count += sum([len(list(section.problem_scores))])
-    count = count - image_explorer_count
+    from custom_views.progress_counters import get_progress_counts
+
+    answered, reset = get_progress_counts(student_id, course_id)
+    index = get_block_index(course_id)
+    if index.has_variable_content and not courseware_summary and course_grade is not None:
+        courseware_summary = list(course_grade.chapter_grades.values())
+    if index.has_variable_content and courseware_summary:
+        count = _count_problem_scores(courseware_summary)
+    else:
+        count = index.countable_problem_count()
     return answered, reset, count
 
 
@@ -208,6 +466,8 @@ def get_all_courses(user, org=None, filter_=None):
     """
     Returns a list of courses available, sorted by course.number optionally filtered by org code.
     """
+    from lms.djangoapps.branding import get_visible_courses
+
     courses = get_visible_courses(org=org, filter_=filter_)
     return courses
 
@@ -216,6 +476,28 @@ def list_all_courses(request, username, org=None, filter_=None):
     """
     Utility to get all visible courses.
     """
+    from lms.djangoapps.course_api.api import get_effective_user
+
     user = get_effective_user(request.user, username)
     return get_all_courses(user, org=org, filter_=filter_)
 
+
+def get_catalog_courses(user, org=None, filter_=None):
+    """
+    Like ``get_all_courses``, but returns lightweight course projections.
+
+    Without ``filter_`` they come from the cached course catalog.
+    """
+    if filter_ is None:
+        return get_course_catalog(org=org)
+    return [course_projection(course) for course in get_all_courses(user, org=org, filter_=filter_)]
+
+
+def list_catalog_courses(request, username, org=None, filter_=None):
+    """
+    Utility to get all visible courses as catalog projections.
+    """
+    from lms.djangoapps.course_api.api import get_effective_user
+
+    user = get_effective_user(request.user, username)
+    return get_catalog_courses(user, org=org, filter_=filter_)
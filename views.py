@@ -1,69 +1,334 @@
 """ API v0 views. """
 import json
 import logging
+from collections import OrderedDict
 from datetime import datetime
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.http import HttpResponseBadRequest, JsonResponse
+from django.db import transaction
+from django.http import (
+    Http404,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date
 from django.utils.translation import ugettext as _
-from django.views.decorators.http import require_GET
+from django.views.decorators.http import require_GET, require_http_methods
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.generics import ListAPIView
+from rest_framework.permissions import IsAdminUser
 
-from common.djangoapps.student.models import CourseEnrollment
-from lms.djangoapps.courseware.models import StudentModule
-from lms.djangoapps.course_api.api import list_courses
+from opaque_keys import InvalidKeyError
 from opaque_keys.edx.keys import CourseKey
+from edx_rest_framework_extensions.auth.jwt.authentication import JwtAuthentication
+from edx_rest_framework_extensions.auth.session.authentication import SessionAuthenticationAllowInactiveUser
 from edx_rest_framework_extensions.paginators import NamespacedPageNumberPagination
+from openedx.core.lib.api.authentication import BearerAuthenticationAllowInactiveUser
 from openedx.core.lib.api.view_utils import DeveloperErrorViewMixin, view_auth_classes
 
-from custom_views.utils import get_grades, reset_student_attempts, list_all_courses
+from custom_views.analytics import DATE_BUCKETS, GROUP_BY_FIELDS, reset_statistics
+from custom_views.bulk_reset import create_bulk_reset_run, resolve_user_ids
+from custom_views.grade_summary import DEFAULT_DETAIL, DETAIL_LEVELS
+from custom_views.grades_cache import cache_grades, get_cached_grades, grade_validator
+from custom_views.instrumentation import instrumented, phase
+from custom_views.jobs import enqueue_bulk_reset_run, submit_reset_job
+from custom_views.models import BulkResetRun, ResetJob
+from custom_views.recorder import recorded
+from custom_views.routers import replica_reads
+from custom_views.singleflight import SingleFlightTimeout, reset_flight_key, single_flight
+from custom_views.utils import get_grades, iter_grades, list_catalog_courses, to_course_key
 
 log = logging.getLogger(__name__)
 USER_MODEL = get_user_model()
+COMPACT_JSON = {"separators": (",", ":")}
 
 
+@transaction.non_atomic_requests
+@recorded("get_grades_api")
+@instrumented("get_grades_api")
 def get_grades_api(request):
     """
     Get grades details providing student and course IDs.
+
+    ``detail`` (course, section or problem; default section) selects how much
+    of the courseware summary is returned.
     """
     course_id_raw = request.GET.get("course_id")
     student_id_raw = request.GET.get("student_id")
-    if not course_id_raw or student_id_raw:
+    if not course_id_raw or not student_id_raw:
+        return HttpResponseBadRequest("course_id and student_id parameters not valid")
+    detail = request.GET.get("detail", DEFAULT_DETAIL)
+    if detail not in DETAIL_LEVELS:
+        return HttpResponseBadRequest("detail must be one of: " + ", ".join(DETAIL_LEVELS))
+    try:
+        student_id = int(student_id_raw)
+        course_key = to_course_key(course_id_raw)
+    except (ValueError, InvalidKeyError):
         return HttpResponseBadRequest("course_id and student_id parameters not valid")
-    grades_details = get_grades(course_id_raw, student_id_raw)
-    return JsonResponse(grades_details)
+
+    # Pollers mostly ask for grades that have not changed since their last
+    # request; answer those from the validator alone.
+    with phase("validator"), replica_reads(student_id):
+        etag, last_modified = grade_validator(student_id, course_key)
+    not_modified = get_conditional_response(
+        request,
+        etag=etag,
+        # Compared with the parsed If-Modified-Since, an int timestamp.
+        last_modified=int(last_modified.timestamp()) if last_modified is not None else None,
+    )
+    if not_modified is None:
+        grades_details = get_cached_grades(student_id, course_key, detail, etag)
+        if grades_details is None:
+            grades_details = get_grades(course_key, student_id, detail)
+            cache_grades(student_id, course_key, detail, etag, grades_details)
+        response = JsonResponse(grades_details, json_dumps_params=COMPACT_JSON)
+    else:
+        response = not_modified
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+def _batch_grade_requests(request):
+    """
+    Return ``{course_id: [student_id, ...] or None}`` from a batch grades request.
+    ``None`` means the whole active roster of the course.
+    """
+    if request.method == "GET":
+        course_id = request.GET.get("course_id")
+        return {course_id: None} if course_id else {}
+    payload = json.loads(request.body or "{}")
+    by_course = OrderedDict()
+    for pair in payload.get("pairs", []):
+        by_course.setdefault(pair["course_id"], []).append(pair["student_id"])
+    if payload.get("course_id"):
+        by_course[payload["course_id"]] = payload.get("student_ids")
+    return by_course
+
+
+def _stream_grades(by_course, detail):
+    # iter_grades routes each chunk of learners to the replica itself.
+    for course_id, student_ids in by_course.items():
+        try:
+            for details in iter_grades(course_id, student_ids, detail=detail):
+                yield json.dumps(details, **COMPACT_JSON) + "\n"
+        except Exception as exc:  # pylint: disable=broad-except
+            log.exception("Failed to compute grades for course %s", course_id)
+            yield json.dumps({"course_id": course_id, "error": str(exc)}) + "\n"
+
+
+@transaction.non_atomic_requests
+@api_view(["GET", "POST"])
+@authentication_classes(
+    (JwtAuthentication, BearerAuthenticationAllowInactiveUser, SessionAuthenticationAllowInactiveUser)
+)
+@permission_classes((IsAdminUser,))
+def get_grades_batch_api(request):
+    """
+    Stream grades as NDJSON for many (student, course) pairs or whole rosters.
+    Staff only; services authenticate with a JWT or OAuth bearer token.
+
+    GET ``?course_id=...`` streams the course roster. POST accepts
+    ``{"pairs": [{"student_id": ..., "course_id": ...}]}`` and/or
+    ``{"course_id": ..., "student_ids": [...]}`` (omit ``student_ids`` for the roster).
+    Work is grouped by course so each course is loaded once. ``?detail=``
+    selects the courseware summary level, see ``grade_summary``.
+    """
+    try:
+        by_course = _batch_grade_requests(request)
+    except (ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest("Invalid batch grades request")
+    if not by_course:
+        return HttpResponseBadRequest("course_id or pairs parameters not valid")
+    detail = request.GET.get("detail", DEFAULT_DETAIL)
+    if detail not in DETAIL_LEVELS:
+        return HttpResponseBadRequest("detail must be one of: " + ", ".join(DETAIL_LEVELS))
+    return StreamingHttpResponse(_stream_grades(by_course, detail), content_type="application/x-ndjson")
 
 
+@recorded("services_reset_course")
+@instrumented("service_reset_course")
 def service_reset_course(request):
+    from common.djangoapps.student.models import CourseEnrollment
+    from custom_views.reset import defer_course_reset, reset_course
+
     user_id = request.GET.get("user_id")
     user = User.objects.get(id=user_id)
     course_id = request.GET.get("course_id").replace(" ", "+")
     course_key = CourseKey.from_string(course_id)
     if not CourseEnrollment.is_enrolled(user, course_key):
         return HttpResponseBadRequest(_("You are not enrolled in this course"))
-    for exam in StudentModule.objects.filter(student=user, course_id=course_id):
-        log.error(exam.module_state_key)
-        try:
-            reset_student_attempts(course_id, user, exam.module_state_key, None, True)
-        except:
-            pass
+    requesting_user = request.user if request.user.is_authenticated else None
+    use_async = _use_async_reset(request)
 
-    for exam in StudentModule.objects.filter(student=user, course_id=course_key):
-        try:
-            state = json.loads(exam.state)
-            resetcount = 0
-            if state.get("resetcount"):
-                resetcount = state["resetcount"]
-            state["attempts"] = 0
-            exam.state = (
-                '{"resetcount":' + str(resetcount + 1) + "}"
-            )  # json.dumps(state)
-            exam.delete()
-        #                exam.save()
-        except:
-            pass
+    def perform_reset():
+        if getattr(settings, "CUSTOM_VIEWS_DEFERRED_RESET", False):
+            defer_course_reset(course_key, user)
+            return {"deferred": True}
+        if use_async:
+            job, _created = submit_reset_job(course_key, user, requesting_user=requesting_user)
+            return {
+                "job_id": str(job.job_id),
+                "status": job.status,
+                "status_url": reverse("custom_views:reset_job_status", args=[job.job_id]),
+            }
+        return reset_course(course_key, user, requesting_user=requesting_user).to_dict()
+
+    try:
+        result, _shared = single_flight(reset_flight_key(user.id, course_key), perform_reset)
+    except SingleFlightTimeout:
+        return JsonResponse({"error": "A reset of this course is already in progress"}, status=409)
+    response = {"Email": user.email, "User ID": user.id, "course_id": course_id}
+    response.update(result)
+    return JsonResponse(response, status=202 if "job_id" in result else 200)
+
+
+def _use_async_reset(request):
+    requested = request.GET.get("async")
+    if requested is not None:
+        return requested.lower() in ("1", "true", "yes")
+    return getattr(settings, "CUSTOM_VIEWS_ASYNC_RESET", False)
+
+
+@login_required
+@require_GET
+def reset_job_status(request, job_id):
+    """
+    Report the progress of a background course reset.
+
+    Only staff, the learner being reset and the user who requested the reset
+    may read it.
+    """
+    try:
+        job = ResetJob.objects.get(job_id=job_id)
+    except ResetJob.DoesNotExist:
+        raise Http404  # lint-amnesty, pylint: disable=raise-missing-from
+    if not request.user.is_staff and request.user.id not in (job.user_id, job.requested_by_id):
+        return HttpResponseForbidden()
+    return JsonResponse(job.to_dict())
+
+
+@require_http_methods(["POST"])
+def bulk_reset_course(request):
+    """
+    Start an administrative reset of a course for many learners.
+
+    Body: ``{"course_id": ..., "user_ids": [...]}``, ``"usernames"``,
+    ``"cohort"`` or ``"all": true``. Returns the run id; progress is reported
+    by ``bulk_reset_status``.
+    """
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    try:
+        payload = json.loads(request.body or "{}")
+        course_key = CourseKey.from_string(payload["course_id"].replace(" ", "+"))
+    except (ValueError, KeyError, TypeError, AttributeError, InvalidKeyError):
+        return HttpResponseBadRequest("course_id parameter not valid")
+    if not any(payload.get(key) for key in ("user_ids", "usernames", "cohort", "all")):
+        return HttpResponseBadRequest("user_ids, usernames, cohort or all is required")
+    for key, item_type in (("user_ids", int), ("usernames", str)):
+        values = payload.get(key) or []
+        if not isinstance(values, list) or not all(isinstance(value, item_type) for value in values):
+            return HttpResponseBadRequest(f"{key} parameter not valid")
+    if not isinstance(payload.get("cohort") or "", str):
+        return HttpResponseBadRequest("cohort parameter not valid")
+    scope, user_ids = resolve_user_ids(
+        course_key,
+        user_ids=payload.get("user_ids"),
+        usernames=payload.get("usernames"),
+        cohort=payload.get("cohort"),
+    )
+    run = create_bulk_reset_run(course_key, user_ids, scope, requested_by=request.user)
+    enqueue_bulk_reset_run(run)
     return JsonResponse(
-        {"Email": user.email, "User ID": user.id, "course_id": course_id}
+        {
+            "run_id": str(run.run_id),
+            "total": run.total,
+            "status_url": reverse("custom_views:bulk_reset_status", args=[run.run_id]),
+        },
+        status=202,
+    )
+
+
+@require_GET
+def bulk_reset_status(request, run_id):
+    """
+    Report the summary of an administrative course reset.
+    """
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    try:
+        run = BulkResetRun.objects.get(run_id=run_id)
+    except BulkResetRun.DoesNotExist:
+        raise Http404  # lint-amnesty, pylint: disable=raise-missing-from
+    return JsonResponse(run.summary())
+
+
+@require_GET
+def reset_statistics_api(request):
+    """
+    Aggregated reset statistics for dashboards.
+
+    Query parameters: ``group_by`` (course or org), ``bucket`` (day, week or
+    month), and the filters ``course_id``, ``org``, ``start`` and ``end``
+    (ISO dates, applied to the last reset date). Bucketed rows report the
+    enrollments last reset in the bucket and their lifetime resets.
+    """
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    group_by = request.GET.get("group_by") or None
+    bucket = request.GET.get("bucket") or None
+    if group_by not in (None, *GROUP_BY_FIELDS) or bucket not in (None, *DATE_BUCKETS):
+        return HttpResponseBadRequest("group_by or bucket parameter not valid")
+    try:
+        course_id = request.GET.get("course_id")
+        course_key = CourseKey.from_string(course_id.replace(" ", "+")) if course_id else None
+        start = parse_date(request.GET["start"]) if request.GET.get("start") else None
+        end = parse_date(request.GET["end"]) if request.GET.get("end") else None
+    except (InvalidKeyError, ValueError):
+        return HttpResponseBadRequest("course_id, start or end parameter not valid")
+    results = reset_statistics(
+        group_by=group_by,
+        bucket=bucket,
+        course_key=course_key,
+        org=request.GET.get("org"),
+        start=start,
+        end=end,
     )
+    return JsonResponse({"results": results})
+
+
+class CourseCatalogPagination(NamespacedPageNumberPagination):
+    max_page_size = 100
+
+
+@view_auth_classes(is_authenticated=False)
+class CourseCatalogListView(DeveloperErrorViewMixin, ListAPIView):
+    """
+    Paginated list of visible courses, served from the cached course catalog.
+
+    Query parameters: ``username`` (defaults to the requesting user), ``org``,
+    ``page`` and ``page_size``.
+    """
+
+    pagination_class = CourseCatalogPagination
+
+    def get_queryset(self):
+        return list_catalog_courses(
+            self.request,
+            self.request.query_params.get("username", self.request.user.username),
+            org=self.request.query_params.get("org"),
+        )
 
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(page)